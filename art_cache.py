@@ -0,0 +1,129 @@
+import asyncio
+import hashlib
+import io
+import logging
+
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, NamedTuple, Tuple
+import numpy as np
+from PIL import Image
+from display import FrameCache, fit_image, pack_frame
+
+if TYPE_CHECKING:
+    import aiohttp
+
+
+class AlbumArtCacheConfig(NamedTuple):
+    cache_size: int
+    cache_path: str | None
+
+
+class AlbumArtCache:
+    def __init__(self, config: dict, display_size: Tuple[int, int], default_image: str):
+        self.config = AlbumArtCacheConfig(
+            cache_size=config.get("cache_size", 32),
+            cache_path=config.get("cache_path"),
+        )
+        self.display_size = display_size
+        self.default_image = default_image
+        self.default_frame: np.ndarray | None = None
+        self.frames = FrameCache(self.config.cache_size)
+        self.pending: Dict[str, asyncio.Task] = {}
+        self.session: "aiohttp.ClientSession | None" = None
+        self.prefetch_task: asyncio.Task | None = None
+
+        self.cache_dir = None
+        if self.config.cache_path:
+            self.cache_dir = Path(self.config.cache_path)
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def set_session(self, session: "aiohttp.ClientSession | None") -> None:
+        self.session = session
+
+    def get(self, url: str | None) -> np.ndarray | None:
+        return self.frames.get(url)
+
+    def get_or_default(self, url: str | None) -> np.ndarray:
+        frame = self.get(url)
+        if frame is not None:
+            return frame
+        if self.default_frame is None:
+            with Image.open(self.default_image) as image:
+                self.default_frame = pack_frame(fit_image(image, self.display_size))
+        return self.default_frame
+
+    async def fetch(self, url: str | None) -> np.ndarray | None:
+        if not url:
+            return None
+        frame = self.get(url)
+        if frame is not None:
+            return frame
+
+        # concurrent requests for the same url share a single download
+        task = self.pending.get(url)
+        if task is None:
+            task = asyncio.create_task(self._fetch(url))
+            self.pending[url] = task
+            task.add_done_callback(lambda _: self.pending.pop(url, None))
+        return await asyncio.shield(task)
+
+    def prefetch(self, urls: List[str | None]) -> None:
+        # low priority warm-up, one download at a time. a newer prefetch
+        # replaces the previous one, shared downloads are not cancelled
+        urls = [url for url in urls if url and url not in self.frames]
+        if self.prefetch_task:
+            self.prefetch_task.cancel()
+        self.prefetch_task = asyncio.create_task(self._prefetch(urls))
+
+    async def _prefetch(self, urls: List[str]) -> None:
+        for url in urls:
+            await self.fetch(url)
+
+    async def _fetch(self, url: str) -> np.ndarray | None:
+        disk_path = self._disk_path(url)
+        try:
+            if disk_path and disk_path.exists():
+                frame = await asyncio.to_thread(self._load, disk_path)
+            else:
+                data = await self._download(url)
+                frame = await asyncio.to_thread(self._decode, data, disk_path)
+        except Exception as e:
+            logging.error("album art fetch failed. %s, %s", e, url)
+            return None
+
+        self.frames.put(url, frame)
+        return frame
+
+    async def _download(self, url: str) -> bytes:
+        import aiohttp
+
+        if self.session is None or self.session.closed:
+            async with aiohttp.ClientSession() as session:
+                return await self._read(session, url)
+        return await self._read(self.session, url)
+
+    @staticmethod
+    async def _read(session: "aiohttp.ClientSession", url: str) -> bytes:
+        import aiohttp
+
+        async with session.get(url, timeout=aiohttp.ClientTimeout(total=10)) as resp:
+            resp.raise_for_status()
+            return await resp.read()
+
+    def _decode(self, data: bytes, disk_path: Path | None) -> np.ndarray:
+        with Image.open(io.BytesIO(data), formats=["JPEG", "PNG"]) as image:
+            frame = fit_image(image, self.display_size)
+        if disk_path:
+            frame.save(disk_path, format="PNG")
+        return pack_frame(frame)
+
+    @staticmethod
+    def _load(path: Path) -> np.ndarray:
+        with Image.open(path, formats=["PNG"]) as image:
+            return pack_frame(image)
+
+    def _disk_path(self, url: str) -> Path | None:
+        if not self.cache_dir:
+            return None
+        key = hashlib.sha1(url.encode()).hexdigest()
+        return self.cache_dir.joinpath(f"{key}.png")
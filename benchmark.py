@@ -0,0 +1,365 @@
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import time
+import yaml
+
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Tuple
+from control import Control
+from encoder import EncoderControl
+from remote import RemoteButton, RemoteControl
+from simulator import Simulator
+from squeezebox import SqueezeboxControl
+
+"""
+End-to-end latency benchmarks on simulated hardware. Each scenario injects a
+burst of input (IR codes or encoder edges) and measures, from the first
+injected event, the time until the first pixels reach the simulated panel
+(first) and until the panel stops changing (settle). Along the way the first
+time each stage of the pipeline is reached is recorded, so a regression can
+be traced to the stage it comes from. Results are compared to a baseline
+saved on the same machine so regressions show up per commit.
+"""
+
+CWD = Path(__file__).resolve().parent
+BASELINE_PATH = CWD.joinpath("benchmark_baseline.json")
+QUIET_PERIOD = 0.3
+# idle time before each gesture, longer than the remote's button debounce
+IDLE_GAP = 0.5
+# a scenario regresses when its p95 grows by this factor plus an absolute slack
+REGRESSION_FACTOR = 1.2
+REGRESSION_SLACK_MS = 5.0
+# p95 of fewer gestures is mostly noise, shorter runs are never compared
+MIN_SAMPLES = 20
+# in pipeline order: IR event read, key handled after the throttles, volume
+# changed, SetVolume received by camilladsp, mode put on the display, frame
+# rendered and handed to the panel, transfer to the panel complete. stages a
+# gesture doesn't go through, e.g. volume for a track change, are left out
+STAGES = (
+    "received",
+    "keypress",
+    "volume_step",
+    "set_main",
+    "display_put",
+    "rendered",
+    "spi",
+)
+
+
+class Sample(NamedTuple):
+    first_ms: float | None
+    settle_ms: float | None
+    events: int
+    dropped: int
+    coalesced: int
+    dsp_commands: int
+    # stage -> ms from the first injected event
+    stages: Dict[str, float]
+
+
+def percentile(values: List[float], p: float) -> float | None:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+class Bench:
+    def __init__(self, config: dict):
+        self.sim = Simulator(config)
+        self.config = self.sim.apply(config)
+        self.dropped = 0
+        # stage -> first time reached in the current gesture
+        self.marks: Dict[str, float] = {}
+
+    async def start(self) -> None:
+        await self.sim.start(self.config)
+        self.ctl = Control(self.config)
+        await self.ctl.connect()
+        self.squeezectl = SqueezeboxControl(self.config["squeezebox"], self.ctl)
+        self.remotectl = RemoteControl(
+            self.config["remote"],
+            self.ctl,
+            mediactl=self.squeezectl,
+            device=self.sim.input_device,
+        )
+        EncoderControl(self.remotectl, self.config.get("encoder", {}), pi=self.sim.pi)
+
+        admit = self.remotectl.admit
+
+        async def counted(press) -> bool:
+            # presses rejected by the remote's throttles
+            accepted = await admit(press)
+            self.dropped += not accepted
+            return accepted
+
+        self.remotectl.admit = counted
+        self.hook_stages()
+        self.tasks = [
+            asyncio.create_task(coro)
+            for coro in (
+                self.squeezectl.refresh_loop(),
+                self.remotectl.refresh_loop(),
+                self.ctl.display_manager.queue.refresh_loop(),
+            )
+        ]
+        self.device = self.ctl.display_manager.queue.displayctl.device
+        await self.quiet()
+
+    def mark(self, stage: str) -> None:
+        # a render only counts once something was put, not a refresh tick
+        if stage == "rendered" and "display_put" not in self.marks:
+            return
+        self.marks.setdefault(stage, time.monotonic())
+
+    def hook(self, obj, name: str, stage: str) -> None:
+        # wraps a method on the instance, calls on the event loop, the render
+        # worker and the fake camilladsp all pass through here
+        fn = getattr(obj, name)
+        if asyncio.iscoroutinefunction(fn):
+
+            async def marked(*args, **kwargs):
+                self.mark(stage)
+                return await fn(*args, **kwargs)
+
+        else:
+
+            def marked(*args, **kwargs):
+                self.mark(stage)
+                return fn(*args, **kwargs)
+
+        setattr(obj, name, marked)
+
+    def hook_stages(self) -> None:
+        display_manager = self.ctl.display_manager
+        self.hook(self.remotectl, "dispatch", "received")
+        self.hook(self.remotectl, "handle_keypress", "keypress")
+        self.hook(self.ctl, "volume_step", "volume_step")
+        self.hook(display_manager, "put", "display_put")
+        self.hook(display_manager, "put_temp", "display_put")
+        self.hook(display_manager.queue.displayctl, "show_frame", "rendered")
+        execute = self.sim.cdsp.execute
+
+        def cdsp_execute(message):
+            if isinstance(message, dict) and "SetVolume" in message:
+                self.mark("set_main")
+            return execute(message)
+
+        self.sim.cdsp.execute = cdsp_execute
+
+    async def stop(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.ctl.close()
+        await self.sim.stop()
+
+    async def quiet(self, since: float = 0, timeout: float = 5.0) -> None:
+        # wait until nothing has been sent to the panel for QUIET_PERIOD,
+        # counting from `since` so slow first frames are not missed
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            last = self.device.transfers[-1].timestamp if self.device.transfers else 0
+            if time.monotonic() - max(last, since) > QUIET_PERIOD:
+                return
+            await asyncio.sleep(QUIET_PERIOD / 4)
+
+    def dsp_commands(self) -> int:
+        return sum(not c.startswith("Get") for c in self.sim.cdsp.commands)
+
+    async def measure(self, gesture: Callable[[], Awaitable[int]]) -> Sample:
+        revert = self.ctl.display_manager.pending_revert
+        if revert:
+            revert.cancel()
+        await self.quiet()
+        await asyncio.sleep(IDLE_GAP)
+        dropped, dsp = self.dropped, self.dsp_commands()
+        coalesced = self.ctl.volume_engine.stats().coalesced
+        self.marks = {}
+        start = time.monotonic()
+        events = await gesture()
+        await self.quiet(since=time.monotonic())
+
+        transfers = [t.timestamp for t in self.device.transfers if t.timestamp > start]
+        rendered = self.marks.get("rendered")
+        if rendered is not None:
+            spi = [t for t in transfers if t >= rendered]
+            if spi:
+                self.marks["spi"] = spi[0]
+        return Sample(
+            first_ms=(transfers[0] - start) * 1000 if transfers else None,
+            settle_ms=(transfers[-1] - start) * 1000 if transfers else None,
+            events=events,
+            dropped=self.dropped - dropped,
+            coalesced=self.ctl.volume_engine.stats().coalesced - coalesced,
+            dsp_commands=self.dsp_commands() - dsp,
+            stages={
+                stage: (self.marks[stage] - start) * 1000
+                for stage in STAGES
+                if stage in self.marks
+            },
+        )
+
+    async def press(self, button: RemoteButton, count: int, interval: float) -> int:
+        for _ in range(count):
+            self.sim.press(button)
+            await asyncio.sleep(interval)
+        return count
+
+    async def turn(self, steps: int, interval: float) -> int:
+        for _ in range(abs(steps)):
+            await asyncio.to_thread(self.sim.pi.turn, 1 if steps > 0 else -1)
+            await asyncio.sleep(interval)
+        return abs(steps)
+
+
+class Scenario(NamedTuple):
+    gesture: Callable[[int], Awaitable[int]]
+    setup: Callable[[], Awaitable] | None = None
+
+
+def scenarios(bench: Bench) -> Dict[str, Scenario]:
+    # every gesture alternates direction so repetitions never hit a limit
+    def vol_repeat(i: int):
+        button = RemoteButton.VOL_UP if i % 2 == 0 else RemoteButton.VOL_DOWN
+        return bench.press(button, count=8, interval=0.11)
+
+    def encoder_spin(i: int):
+        return bench.turn(20 if i % 2 == 0 else -20, interval=0.01)
+
+    def input_cycle(i: int):
+        return bench.press(RemoteButton.GT_TEN, count=5, interval=0.3)
+
+    async def digital_input():
+        # album art is only shown on the Digital input
+        await asyncio.sleep(IDLE_GAP)
+        await bench.press(RemoteButton.FOUR, count=1, interval=0)
+        await bench.quiet()
+
+    def track_change(i: int):
+        button = RemoteButton.NEXT if i % 2 == 0 else RemoteButton.PREV
+        return bench.press(button, count=1, interval=0)
+
+    return {
+        "vol_repeat": Scenario(vol_repeat),
+        "encoder_spin": Scenario(encoder_spin),
+        "input_cycle": Scenario(input_cycle),
+        "track_change": Scenario(track_change, setup=digital_input),
+    }
+
+
+def summarize(samples: List[Sample]) -> dict:
+    first = [s.first_ms for s in samples if s.first_ms is not None]
+    settle = [s.settle_ms for s in samples if s.settle_ms is not None]
+    n = len(samples)
+    return {
+        "first_p50_ms": percentile(first, 50),
+        "first_p95_ms": percentile(first, 95),
+        "first_p99_ms": percentile(first, 99),
+        "settle_p50_ms": percentile(settle, 50),
+        "settle_p95_ms": percentile(settle, 95),
+        "settle_p99_ms": percentile(settle, 99),
+        "events_per_gesture": sum(s.events for s in samples) / n,
+        "dropped_per_gesture": sum(s.dropped for s in samples) / n,
+        "coalesced_per_gesture": sum(s.coalesced for s in samples) / n,
+        "dsp_commands_per_gesture": sum(s.dsp_commands for s in samples) / n,
+        "no_frame": n - len(first),
+        "samples": n,
+    } | summarize_stages(samples)
+
+
+def summarize_stages(samples: List[Sample]) -> dict:
+    # percentiles of the time each stage was reached, for the stages the
+    # scenario goes through
+    summary = {}
+    for stage in STAGES:
+        values = [s.stages[stage] for s in samples if stage in s.stages]
+        if not values:
+            continue
+        for p in (50, 95, 99):
+            summary[f"{stage}_p{p}_ms"] = percentile(values, p)
+    return summary
+
+
+def regressions(results: dict, baseline: dict) -> List[Tuple[str, str]]:
+    # (scenario, description) for each p95 over the threshold
+    found = []
+    for name, result in results.items():
+        samples = min(result["samples"], baseline.get(name, {}).get("samples", 0))
+        if samples < MIN_SAMPLES:
+            continue
+        keys = ["first_p95_ms", "settle_p95_ms"]
+        keys += [f"{stage}_p95_ms" for stage in STAGES]
+        for key in keys:
+            old, new = baseline.get(name, {}).get(key), result.get(key)
+            if old is None or new is None:
+                continue
+            if new > old * REGRESSION_FACTOR + REGRESSION_SLACK_MS:
+                found.append((name, f"{name}.{key}: {old:.1f}ms -> {new:.1f}ms"))
+    return found
+
+
+async def run(config: dict, repeat: int, only: List[str] | None) -> dict:
+    bench = Bench(config)
+    await bench.start()
+    results = {}
+    try:
+        for name, scenario in scenarios(bench).items():
+            if only and name not in only:
+                continue
+            if scenario.setup:
+                await scenario.setup()
+            samples = [
+                await bench.measure(lambda: scenario.gesture(i)) for i in range(repeat)
+            ]
+            results[name] = summarize(samples)
+            logging.info("%s. %s", name, results[name])
+    finally:
+        await bench.stop()
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config-file", help="path to config file")
+    parser.add_argument(
+        "--repeat", type=int, default=MIN_SAMPLES, help="gestures per scenario"
+    )
+    parser.add_argument("--scenario", action="append", help="run only these")
+    parser.add_argument(
+        "--save-baseline", action="store_true", help="store results as baseline"
+    )
+    parser.add_argument("--log", default="WARNING", help="sets logging level")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log)
+
+    config_file = (
+        Path(args.config_file) if args.config_file else CWD.joinpath("config.yaml")
+    )
+    config = yaml.safe_load(config_file.read_text())
+    results = asyncio.run(run(config, args.repeat, args.scenario))
+    print(json.dumps(results, indent=2))
+
+    if args.save_baseline:
+        BASELINE_PATH.write_text(json.dumps(results, indent=2) + "\n")
+        return 0
+    if not BASELINE_PATH.exists():
+        return 0
+    baseline = json.loads(BASELINE_PATH.read_text())
+    found = regressions(results, baseline)
+    if found:
+        # a run is only failed when the scenarios regress again on a rerun
+        names = sorted({name for name, _ in found})
+        logging.warning("rerunning. %s", names)
+        rerun = asyncio.run(run(config, args.repeat, names))
+        found = regressions(rerun, baseline)
+    for _, r in found:
+        print(f"REGRESSION {r}", file=sys.stderr)
+    return 1 if found else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
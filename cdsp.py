@@ -0,0 +1,194 @@
+import asyncio
+import logging
+import queue
+import threading
+import time
+
+from collections import deque
+from typing import TYPE_CHECKING, Any, Callable, Deque, Dict, NamedTuple
+from metrics import REGISTRY
+
+if TYPE_CHECKING:
+    from camilladsp import CamillaClient
+
+MIN_BACKOFF: float = 0.5
+MAX_BACKOFF: float = 8.0
+COMMAND_SECONDS = REGISTRY.histogram(
+    "pi_player_cdsp_command_seconds", "CamillaDSP websocket command round trip"
+)
+COMMAND_ERRORS = REGISTRY.counter(
+    "pi_player_cdsp_command_errors_total", "Failed CamillaDSP commands"
+)
+
+
+class CommandError(Exception):
+    # camilladsp rejected a command, e.g. an invalid config. the connection
+    # is fine
+    pass
+
+
+class CamillaCommand(NamedTuple):
+    name: str
+    fn: Callable[["CamillaClient"], Any]
+    future: asyncio.Future
+
+
+class CamillaConnection:
+    # owns the CamillaClient on a dedicated thread. commands are queued from
+    # the event loop and executed back to back, the connection is re-opened
+    # with backoff whenever it drops and the desired state is replayed
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 1234):
+        self.host = host
+        self.port = port
+        # created on the cdsp thread, which also pays for importing camilladsp
+        self.client: "CamillaClient | None" = None
+        self.commands: queue.Queue[CamillaCommand | None] = queue.Queue()
+        self.connected = False
+        self.ready: asyncio.Event | None = None
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.thread: threading.Thread | None = None
+        self.desired_volume: float | None = None
+        self.desired_config_path: str | None = None
+        self.rtt: Dict[str, Deque[float]] = {}
+
+    def start(self) -> None:
+        self.loop = asyncio.get_running_loop()
+        self.ready = asyncio.Event()
+        self.thread = threading.Thread(target=self.run, name="cdsp", daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.commands.put(None)
+
+    async def call(self, name: str, fn: Callable[["CamillaClient"], Any]) -> Any:
+        future = self.loop.create_future()
+        self.commands.put(CamillaCommand(name=name, fn=fn, future=future))
+        return await future
+
+    async def config_file_path(self) -> str:
+        return await self.call("file_path", lambda c: c.config.file_path())
+
+    async def set_volume(self, volume: float) -> None:
+        self.desired_volume = volume
+        await self.call("set_main", lambda c: c.volume.set_main(volume))
+
+    async def set_config_file_path(self, path: str, reload: bool = True) -> None:
+        # without reload only the path camilladsp reports and restarts with
+        # changes, e.g. when the running config is already the same
+        self.desired_config_path = path
+
+        def apply(client: "CamillaClient"):
+            client.config.set_file_path(path)
+            if reload:
+                client.general.reload()
+
+        await self.call("set_config" if reload else "set_file_path", apply)
+
+    async def set_active_config(self, path: str, config: dict) -> None:
+        self.desired_config_path = path
+
+        def apply(client: "CamillaClient"):
+            client.config.set_file_path(path)
+            client.config.set_active(config)
+
+        await self.call("set_active", apply)
+
+    async def validate_config(self, config: dict) -> dict:
+        return await self.call("validate", lambda c: c.config.validate(config))
+
+    def latency(self) -> Dict[str, float]:
+        return {name: sum(v) / len(v) for name, v in self.rtt.items() if v}
+
+    def run(self) -> None:
+        from camilladsp import CamillaClient
+
+        self.client = CamillaClient(self.host, self.port)
+        backoff = MIN_BACKOFF
+        while True:
+            if not self.connected:
+                if self.connect():
+                    backoff = MIN_BACKOFF
+                else:
+                    backoff = min(backoff * 2, MAX_BACKOFF)
+            try:
+                command = self.commands.get(timeout=None if self.connected else backoff)
+            except queue.Empty:
+                continue
+            if command is None:
+                break
+            self.execute(command)
+
+        if self.connected:
+            self.client.disconnect()
+
+    def connect(self) -> bool:
+        try:
+            self.client.connect()
+            self.replay()
+        except Exception as e:
+            logging.warning("cdsp connect failed. %s", e)
+            self.disconnect()
+            return False
+
+        logging.info("cdsp connected")
+        self.connected = True
+        self.loop.call_soon_threadsafe(self.ready.set)
+        return True
+
+    def disconnect(self) -> None:
+        self.connected = False
+        self.loop.call_soon_threadsafe(self.ready.clear)
+        try:
+            self.client.disconnect()
+        except Exception:
+            pass
+
+    def replay(self) -> None:
+        path = self.desired_config_path
+        if path and self.client.config.file_path() != path:
+            logging.info("cdsp replay config. %s", path)
+            self.client.config.set_file_path(path)
+            self.client.general.reload()
+        if self.desired_volume is not None:
+            logging.info("cdsp replay volume. %.1fdB", self.desired_volume)
+            self.client.volume.set_main(self.desired_volume)
+
+    def execute(self, command: CamillaCommand) -> None:
+        from camilladsp import CamillaError
+
+        if not self.connected:
+            self.resolve(command.future, exc=ConnectionError("cdsp not connected"))
+            return
+
+        start = time.monotonic()
+        try:
+            result = command.fn(self.client)
+        except CamillaError as e:
+            COMMAND_ERRORS.inc(command=command.name)
+            self.resolve(command.future, exc=CommandError(str(e)))
+            return
+        except Exception as e:
+            # the desired state is replayed once the connection is back
+            logging.error("cdsp %s failed. %s", command.name, e)
+            COMMAND_ERRORS.inc(command=command.name)
+            self.disconnect()
+            self.resolve(command.future, exc=ConnectionError(str(e)))
+            return
+
+        rtt = time.monotonic() - start
+        self.rtt.setdefault(command.name, deque(maxlen=100)).append(rtt)
+        COMMAND_SECONDS.observe(rtt, command=command.name)
+        logging.debug("cdsp %s. %.1fms", command.name, rtt * 1000)
+        self.resolve(command.future, result=result)
+
+    def resolve(self, future: asyncio.Future, result=None, exc=None) -> None:
+        def set():
+            if future.cancelled():
+                return
+            if exc:
+                future.set_exception(exc)
+            else:
+                future.set_result(result)
+
+        self.loop.call_soon_threadsafe(set)
@@ -0,0 +1,75 @@
+import asyncio
+import logging
+import time
+import yaml
+
+from pathlib import Path
+from typing import Dict, List, NamedTuple
+from cdsp import CamillaConnection
+from control_state import Input
+from metrics import REGISTRY
+
+SWITCH_SECONDS = REGISTRY.histogram(
+    "pi_player_config_switch_seconds", "Input config switch, by how it was applied"
+)
+
+
+class PreloadedConfig(NamedTuple):
+    path: str
+    config: dict
+
+
+class ConfigSwitcher:
+    # every camilladsp config referenced by the inputs is parsed and validated
+    # once at startup. switches to an identical config only move the file
+    # path and the rest are pushed directly instead of having camilladsp
+    # re-read the file
+
+    def __init__(self, cdsp: CamillaConnection, configs_path: str, inputs: List[Input]):
+        self.cdsp = cdsp
+        self.configs_path = configs_path
+        self.filenames = sorted({f for input in inputs for f in input.configs})
+        self.configs: Dict[str, PreloadedConfig] = {}
+        self.active: str | None = None
+
+    async def preload(self, active: str | None = None) -> None:
+        for filename in self.filenames:
+            path = f"{self.configs_path}{filename}"
+            try:
+                raw = await asyncio.to_thread(Path(path).read_text)
+                config = await self.cdsp.validate_config(yaml.safe_load(raw))
+            except Exception as e:
+                logging.error("config preload failed. %s. %s", path, e)
+                continue
+            self.configs[filename] = PreloadedConfig(path=path, config=config)
+        self.active = active
+        logging.info("preloaded %d/%d configs", len(self.configs), len(self.filenames))
+
+    def is_same_config(self, filename: str) -> bool:
+        target = self.configs.get(filename)
+        active = self.configs.get(self.active)
+        return (
+            target is not None and active is not None and target.config == active.config
+        )
+
+    async def switch(self, filename: str) -> None:
+        start = time.monotonic()
+        preloaded = self.configs.get(filename)
+        path = preloaded.path if preloaded else f"{self.configs_path}{filename}"
+        if self.active == filename:
+            kind = "noop"
+        elif self.is_same_config(filename):
+            # nothing to reload, but camilladsp must restart on the new file
+            kind = "path"
+            await self.cdsp.set_config_file_path(path, reload=False)
+        elif preloaded:
+            kind = "push"
+            await self.cdsp.set_active_config(path, preloaded.config)
+        else:
+            kind = "reload"
+            await self.cdsp.set_config_file_path(path)
+        self.active = filename
+
+        elapsed = time.monotonic() - start
+        SWITCH_SECONDS.observe(elapsed, kind=kind)
+        logging.info("config switch. %s (%s). %.1fms", filename, kind, elapsed * 1000)
@@ -1,15 +1,20 @@
+import asyncio
 import logging
 from typing import List
-from camilladsp import CamillaClient
+from cdsp import CamillaConnection, CommandError
+from config_switch import ConfigSwitcher
 from control_state import ControlState, Input, InputMode
 from display_modes import (
     VolumeDisplayMode,
     DisplayManager,
+    ImageGalleryDisplayMode,
     InputDisplayMode,
-    AlbumArtDisplayMode,
+    MediaPlayerDisplayMode,
+    MessageDisplayMode,
 )
+from power import PowerManager
 from song_state import SongState
-
+from volume import VolumeEngine
 
 MIN_VOLUME: float = -80.0
 MAX_VOLUME: float = 0.0
@@ -19,6 +24,8 @@ DIM_STEP: float = 20.0
 class ControlConfig:
     def __init__(self, config: dict):
         self.cdsp_configs_path = config["camilladsp_configs_path"]
+        self.cdsp_host = config.get("camilladsp_host", "127.0.0.1")
+        self.cdsp_port = config.get("camilladsp_port", 1234)
         self.inputs: List[Input] = []
         index = 0
         for k, v in config["inputs"].items():
@@ -32,12 +39,36 @@ class Control:
         self,
         config: dict,
     ):
-        self.display_manager = DisplayManager()
+        self.raw_config = config
+        # opened by connect, concurrently with the camilladsp connection
+        self.display_manager: DisplayManager | None = None
         self.config = ControlConfig(config)
 
-        self.cdsp_client = CamillaClient("127.0.0.1", 1234)
-        self.cdsp_client.connect()
-        cdsp_config_path = self.cdsp_client.config.file_path().removeprefix(
+        self.cdsp = CamillaConnection(self.config.cdsp_host, self.config.cdsp_port)
+        self.config_switcher = ConfigSwitcher(
+            self.cdsp, self.config.cdsp_configs_path, self.config.inputs
+        )
+        self.volume_engine = VolumeEngine(
+            set_volume=self.cdsp.set_volume,
+            interval=config.get("volume", {}).get("command_interval", 0.05),
+        )
+        self.state: ControlState | None = None
+        self.song_state: SongState | None = None
+        self.album_art_task: asyncio.Task | None = None
+        self.show_track_info = False
+        self.gallery_index = 0
+        self.power = PowerManager(config.get("power", {}))
+
+    async def connect(self) -> None:
+        # camilladsp connects on its own thread while the display is brought
+        # up on another. a startup message is shown as soon as the panel is on
+        self.cdsp.start()
+        self.display_manager = await asyncio.to_thread(DisplayManager, self.raw_config)
+        self.display_manager.queue.start()
+        self.power.subscribe(self.display_manager.set_power)
+        self.display_manager.put(MessageDisplayMode("starting"))
+        await self.cdsp.ready.wait()
+        cdsp_config_path = (await self.cdsp.config_file_path()).removeprefix(
             self.config.cdsp_configs_path
         )
         current_input = None
@@ -49,12 +80,20 @@ class Control:
                     break
 
         assert current_input is not None, f"invalid input file {cdsp_config_path}"
+        await self.config_switcher.preload(active=cdsp_config_path)
 
         self.state = ControlState(current_input, input_mode)
         self.display_manager.put(InputDisplayMode(self.state))
-        self.cdsp_client.volume.set_main(self.state.volume)
-        self.song_state: SongState | None = None
+        await self.cdsp.set_volume(self.state.volume)
         logging.info("cdsp connected. %s", self.state)
+        # scaled after startup, so it doesn't compete with the first frames
+        if self.display_manager.gallery:
+            self.display_manager.gallery.start()
+
+    def close(self) -> None:
+        self.cdsp.stop()
+        if self.display_manager:
+            self.display_manager.queue.displayctl.close()
 
     async def change_input_mode(self, mode: InputMode) -> None:
         self.state.input_mode = (
@@ -73,12 +112,14 @@ class Control:
         await self.apply_input_state()
 
     async def apply_input_state(self):
-        path = f"{self.config.cdsp_configs_path}{self.state.input.configs[self.state.input_mode.value]}"
-        logging.info("apply_input_state. %s. %s", self.state, path)
-        self.cdsp_client.config.set_file_path(path)
-        self.cdsp_client.general.reload()
+        filename = self.state.input.configs[self.state.input_mode.value]
+        logging.info("apply_input_state. %s. %s", self.state, filename)
+        try:
+            await self.config_switcher.switch(filename)
+        except (ConnectionError, CommandError) as e:
+            logging.error("apply_input_state failed. %s", e)
         if self.state.input.name == "Digital" and self.song_state:
-            self.display_manager.put(AlbumArtDisplayMode(self.song_state))
+            self.show_song(self.song_state)
         else:
             self.display_manager.put(InputDisplayMode(self.state))
 
@@ -91,7 +132,7 @@ class Control:
             return
 
         logging.info("volume_step. %.2fdB", next_volume)
-        self.cdsp_client.volume.set_main(next_volume)
+        self.volume_engine.request(next_volume)
         self.state.volume = next_volume
         self.display_manager.put_temp(VolumeDisplayMode(self.state.volume))
 
@@ -109,4 +150,34 @@ class Control:
         self.song_state = song_state
 
         if self.state.input.name == "Digital":
-            self.display_manager.put(AlbumArtDisplayMode(song_state))
+            self.show_song(song_state)
+
+    async def toggle_track_info(self) -> None:
+        self.show_track_info = not self.show_track_info
+        logging.info("toggle_track_info. %s", self.show_track_info)
+        if self.state.input.name == "Digital" and self.song_state:
+            self.show_song(self.song_state)
+
+    async def show_gallery(self) -> None:
+        # shows the gallery, or the next image when it's already showing
+        gallery = self.display_manager.gallery
+        if gallery is None:
+            return
+        current = self.display_manager.current
+        if isinstance(current, ImageGalleryDisplayMode):
+            self.gallery_index = current.current_index() + 1
+        logging.info("show_gallery. %d", self.gallery_index % len(gallery))
+        self.display_manager.put(ImageGalleryDisplayMode(gallery, self.gallery_index))
+
+    def show_song(self, song_state: SongState) -> None:
+        if self.show_track_info:
+            self.display_manager.put(
+                MediaPlayerDisplayMode(
+                    song_state, progress=True, marquee=self.display_manager.marquee
+                )
+            )
+            return
+        # fetch in the background so callers never wait on the http request
+        self.album_art_task = asyncio.create_task(
+            self.display_manager.put_album_art(song_state)
+        )
@@ -1,59 +1,341 @@
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 from enum import Enum, auto
-from PIL import Image, ImageOps
-from luma.core.render import canvas
-from luma.core.interface.serial import spi
-from luma.oled.device import ssd1351
-from luma.lcd.device import st7789
+from typing import Callable, Hashable, Iterator, List, Tuple
+import numpy as np
+from PIL import Image, ImageDraw, ImageOps
+from metrics import REGISTRY, startup_milestone
+
+TRANSFER_SECONDS = REGISTRY.histogram(
+    "pi_player_display_transfer_seconds", "Time spent writing a frame to the panel"
+)
+TRANSFER_BYTES = REGISTRY.counter(
+    "pi_player_display_transfer_bytes_total", "Pixel bytes written to the panel"
+)
+
+
+def fit_image(image: Image.Image, size, stretch=False) -> Image.Image:
+    image = image.convert("RGB")
+    if stretch:
+        return image.resize(size)
+    return ImageOps.pad(ImageOps.contain(image, size), size)
+
+
+class FrameCache:
+    # shared between the render worker and the event loop, e.g. album art is
+    # put by the loop while the worker reads it
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.frames: OrderedDict = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self.lock:
+            return key in self.frames
+
+    def get(self, key: Hashable):
+        with self.lock:
+            frame = self.frames.get(key)
+            if frame is not None:
+                self.frames.move_to_end(key)
+            return frame
+
+    def put(self, key: Hashable, frame) -> None:
+        with self.lock:
+            self.frames[key] = frame
+            self.frames.move_to_end(key)
+            while len(self.frames) > self.maxsize:
+                self.frames.popitem(last=False)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.frames.clear()
+
+
+def dirty_boxes(
+    prev: np.ndarray, curr: np.ndarray, gap: int = 8
+) -> List[Tuple[int, int, int, int]]:
+    # bounding boxes (left, top, right, bottom) of changed pixels. changed rows
+    # are grouped into bands, bands closer than `gap` rows are merged
+    changed = prev != curr
+    rows = np.flatnonzero(changed.any(axis=1))
+    if rows.size == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(rows) > gap)
+    tops = np.concatenate(([rows[0]], rows[breaks + 1]))
+    bottoms = np.concatenate((rows[breaks], [rows[-1]])) + 1
+    boxes = []
+    for top, bottom in zip(tops, bottoms):
+        cols = np.flatnonzero(changed[top:bottom].any(axis=0))
+        boxes.append((int(cols[0]), int(top), int(cols[-1]) + 1, int(bottom)))
+    return boxes
+
+
+def pack_rgb565(pixels: np.ndarray) -> np.ndarray:
+    r = pixels[..., 0].astype(np.uint16)
+    g = pixels[..., 1].astype(np.uint16)
+    b = pixels[..., 2].astype(np.uint16)
+    return ((r & 0xF8) << 8 | (g & 0xFC) << 3 | b >> 3).astype(">u2")
+
+
+def unpack_rgb565(packed: np.ndarray) -> np.ndarray:
+    # low bits are filled from the high bits so white stays 255
+    r = (packed >> 11 & 0x1F).astype(np.uint8)
+    g = (packed >> 5 & 0x3F).astype(np.uint8)
+    b = (packed & 0x1F).astype(np.uint8)
+    return np.stack((r << 3 | r >> 2, g << 2 | g >> 4, b << 3 | b >> 2), axis=-1)
+
+
+def pack_frame(image: Image.Image) -> np.ndarray:
+    # frames are kept in the panels' native format, 16bit RGB565 big endian,
+    # so cached frames are converted once and written without conversion.
+    # the OLED's BGR wiring is handled by the controller's remap setting
+    return pack_rgb565(np.asarray(image.convert("RGB")))
+
+
+def direct_supported(device, type: "DisplayType") -> bool:
+    # the luma internals write_window relies on, checked against the
+    # installed luma version rather than assumed
+    if type == DisplayType.FRAMEBUFFER:
+        return True
+    if getattr(device, "rotate", 0) != 0 or not hasattr(device, "data"):
+        return False
+    if type == DisplayType.OLED:
+        return hasattr(device, "_apply_offsets") and hasattr(device, "_set_position")
+    return hasattr(device, "set_window")
+
+
+def fast_spi(device):
+    # spidev of a luma spi interface, None when it isn't one
+    serial = getattr(device, "_serial_interface", None)
+    spidev = getattr(serial, "_spi", None)
+    attrs = ("_gpio", "_DC", "_data_mode")
+    if hasattr(spidev, "writebytes2") and all(hasattr(serial, a) for a in attrs):
+        return spidev
+    return None
 
 
 class DisplayType(Enum):
     LCD = auto()
     OLED = auto()
+    # any panel with a kernel framebuffer driver, e.g. fbtft
+    FRAMEBUFFER = auto()
+    SIMULATED = auto()
 
 
 class DisplayControl:
+    # above this fraction of the screen a single full frame is cheaper than
+    # several address windows
+    PARTIAL_MAX_AREA = 0.6
+
     def __init__(
         self,
         type: DisplayType,
+        frame_cache_size: int = 64,
+        framebuffer: str = "/dev/fb1",
+        backlight_pwm_hz: float | None = None,
+        rotate: int = 0,
     ):
-        if type == DisplayType.OLED:
+        # device drivers are imported on demand, luma pulls in the gpio stack
+        if type == DisplayType.SIMULATED:
+            from simulator import SimulatedDevice
+
+            device = SimulatedDevice(width=240, height=240, rotate=rotate)
+        elif type == DisplayType.FRAMEBUFFER:
+            from framebuffer import FramebufferDevice
+
+            device = FramebufferDevice(framebuffer)
+        elif type == DisplayType.OLED:
+            from luma.core.framebuffer import full_frame
+            from luma.core.interface.serial import spi
+            from luma.oled.device import ssd1351
+
             serial = spi(
                 gpio_DC=23,
                 gpio_RST=24,
                 bus_speed_hz=16000000,
             )
-            device = ssd1351(serial_interface=serial, bgr=True)
-            device.contrast(192)
+            # diffing is done here, luma must not skip regions on its own
+            device = ssd1351(
+                serial_interface=serial,
+                bgr=True,
+                framebuffer=full_frame(),
+                rotate=rotate,
+            )
         else:
+            from luma.core.interface.serial import spi
+            from luma.lcd.device import st7789
+
             serial = spi(
                 gpio_DC=23,
                 gpio_RST=24,
                 bus_speed_hz=52000000,
             )
-            device = st7789(serial_interface=serial, active_low=False)
+            # the backlight can only be dimmed when driven by PWM
+            device = st7789(
+                serial_interface=serial,
+                active_low=False,
+                pwm_frequency=backlight_pwm_hz,
+                rotate=rotate,
+            )
         self.device = device
+        self.type = type
+        # frames are written to the panel's address window directly, through
+        # luma internals. with a rotation or a luma version that lacks them
+        # frames go through luma's display() instead
+        self.direct = direct_supported(device, type)
+        if not self.direct:
+            logging.warning(
+                "display. using luma display(), %s", device.__class__.__name__
+            )
+        elif type == DisplayType.LCD:
+            # COLMOD 16bit/pixel instead of luma's 18bit, same format as the
+            # OLED and a third fewer bytes per frame. luma's display() and
+            # clear() can't be used after this
+            device.command(0x3A, 0x05)
+        # spidev's writebytes2 takes the buffer as is, luma's data() copies
+        # the pixels into a list and writes it in 4k slices
+        self.spidev = fast_spi(device) if self.direct else None
+        self.backlight_pwm = backlight_pwm_hz is not None
+        self.last_frame: np.ndarray | None = None
+        self.frame_cache = FrameCache(frame_cache_size)
+        # set by the render worker. checked right before the SPI transfer so a
+        # frame that has been superseded is never written to the panel
+        self.abandon: Callable[[], bool] = lambda: False
+        self.frames_shown = 0
+        # pixel bytes sent for the last frame, 0 if it was unchanged
+        self.frame_bytes = 0
+        # serializes panel access between the render worker and power changes
+        self.lock = threading.Lock()
+        # while asleep frames only replace last_frame, wake() sends it
+        self.asleep = False
+        self.stale = False
 
     def close(self):
+        if self.type == DisplayType.LCD and self.direct:
+            # luma's cleanup() would clear() the panel with an 18bit frame,
+            # blank it in the 16bit format instead
+            with self.lock:
+                width, height = self.display_size()
+                blank = np.zeros((height, width), dtype=">u2")
+                self.write_window(blank, (0, 0, width, height))
+                self.device.hide()
+                self.device.persist = True
         self.device.cleanup()
 
-    def clear(self):
-        self.device.clear()
-
     def display_size(self):
         return self.device.size
 
+    def set_brightness(self, level: int) -> None:
+        # 0-255. the OLED scales its drive current, the LCD its backlight. a
+        # backlight without PWM is only switched on or off
+        with self.lock:
+            if self.type != DisplayType.LCD:
+                self.device.contrast(level)
+            elif self.backlight_pwm:
+                self.device.backlight(level * 100 / 255)
+            else:
+                self.device.backlight(level > 0)
+
+    def sleep(self) -> None:
+        with self.lock:
+            if self.asleep:
+                return
+            self.asleep = True
+            self.device.hide()
+            if self.type == DisplayType.LCD:
+                self.device.backlight(False)
+
+    def wake(self, brightness: int) -> None:
+        with self.lock:
+            if self.asleep:
+                self.asleep = False
+                if self.stale and self.last_frame is not None:
+                    height, width = self.last_frame.shape
+                    self.write_window(self.last_frame, (0, 0, width, height))
+                self.stale = False
+                self.device.show()
+        self.set_brightness(brightness)
+
     def show_image(self, path: str, stretch=False) -> None:
-        image = Image.open(path, formats=["JPEG", "PNG"]).convert("RGB")
+        with Image.open(path, formats=["JPEG", "PNG"]) as image:
+            self.show_frame(fit_image(image, self.display_size(), stretch=stretch))
 
-        if not stretch:
-            image = ImageOps.pad(
-                ImageOps.contain(image, self.display_size()), self.display_size()
-            )
+    def show_frame(self, frame: Image.Image | np.ndarray) -> None:
+        # frame is an image or a frame already packed by pack_frame
+        if self.abandon():
+            logging.debug("show_frame. abandoned stale frame")
+            return
+        if isinstance(frame, Image.Image):
+            frame = pack_frame(frame)
+        with self.lock:
+            if self.asleep:
+                self.last_frame = frame
+                self.stale = True
+                return
+            full = [(0, 0, frame.shape[1], frame.shape[0])]
+            if self.last_frame is None or self.last_frame.shape != frame.shape:
+                boxes = full
+            else:
+                boxes = dirty_boxes(self.last_frame, frame)
+                area = sum((r - l) * (b - t) for l, t, r, b in boxes)
+                if area > self.PARTIAL_MAX_AREA * frame.shape[0] * frame.shape[1]:
+                    boxes = full
+
+            if boxes and not self.direct:
+                boxes = full
+            kind = "full" if boxes == full else "partial"
+            with TRANSFER_SECONDS.time(kind=kind):
+                self.frame_bytes = sum(self.write_window(frame, b) for b in boxes)
+            self.last_frame = frame
+        self.shown()
+
+    def shown(self) -> None:
+        self.frames_shown += 1
+        if self.frames_shown == 1:
+            startup_milestone("first frame")
+
+    def write_window(self, frame: np.ndarray, box: Tuple[int, int, int, int]) -> int:
+        # returns the number of pixel bytes written
+        left, top, right, bottom = box
+        if self.type == DisplayType.FRAMEBUFFER:
+            nbytes = self.device.write(frame, box)
+            TRANSFER_BYTES.inc(nbytes)
+            return nbytes
+        if not self.direct:
+            # full frames only, luma rotates and converts
+            self.device.display(Image.fromarray(unpack_rgb565(frame), "RGB"))
+            nbytes = frame.size * (3 if self.type == DisplayType.LCD else 2)
+            TRANSFER_BYTES.inc(nbytes)
+            return nbytes
+        data = frame[top:bottom, left:right].tobytes()
+        if self.type == DisplayType.OLED:
+            left, top, right, bottom = self.device._apply_offsets(box)
+            self.device._set_position(top, right, bottom, left)
+        else:
+            self.device.set_window(left, top, right, bottom)
+        self.send(data)
+        TRANSFER_BYTES.inc(len(data))
+        return len(data)
+
+    def send(self, data: bytes) -> None:
+        if self.spidev:
+            serial = self.device._serial_interface
+            serial._gpio.output(serial._DC, serial._data_mode)
+            self.spidev.writebytes2(data)
         else:
-            image = image.resize(self.display_size())
+            self.device.data(data)
 
-        self.device.display(image)
-        image.close()
+    def new_frame(self) -> Image.Image:
+        return Image.new(self.device.mode, self.display_size())
 
-    def get_canvas(self) -> canvas:
-        return canvas(self.device)
+    @contextmanager
+    def get_canvas(self) -> Iterator[ImageDraw.ImageDraw]:
+        image = self.new_frame()
+        yield ImageDraw.Draw(image)
+        self.show_frame(image)
@@ -1,76 +1,257 @@
 import asyncio
+import functools
 import logging
-import urllib.request
-from typing import List
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Hashable, NamedTuple, Tuple
 from pathlib import Path
+import numpy as np
+from art_cache import AlbumArtCache
 from control_state import ControlState, InputMode
-from display import DisplayControl, DisplayType
+from display import DisplayControl, DisplayType, pack_frame
+from gallery import Gallery
+from glyphs import GlyphAtlas
+from metrics import REGISTRY
+from power import PowerState
 from song_state import SongState
-from PIL import ImageFont
-
+from PIL import Image, ImageDraw, ImageFont
 
 RESOURCES_PATH = Path(__file__).resolve().parent.joinpath("resources")
+FONT_PATH = str(RESOURCES_PATH.joinpath("Hack-Regular.ttf"))
+RENDER_SECONDS = REGISTRY.histogram(
+    "pi_player_display_render_seconds", "Time to render a display mode"
+)
+QUEUE_DEPTH = REGISTRY.gauge(
+    "pi_player_display_queue_depth", "Display modes put since the last render"
+)
+SUPERSEDED = REGISTRY.counter(
+    "pi_player_display_superseded_total", "Display modes replaced before rendering"
+)
+DROPPED_FRAMES = REGISTRY.counter(
+    "pi_player_display_dropped_frames_total",
+    "Animation frames skipped because the previous frame was late",
+)
+
+
+class AnimationConfig(NamedTuple):
+    fps: float
+    # bytes per second animated modes may send to the panel, frames that
+    # change more pixels are spaced further apart
+    bandwidth: int
+
+
+class MarqueeConfig(NamedTuple):
+    enabled: bool
+    # pixels per second
+    speed: float
+    # seconds the start of the text is held before each pass
+    pause: float
+
+
+@functools.cache
+def get_font(size: int, path: str = FONT_PATH) -> ImageFont.FreeTypeFont:
+    # loaded on first use and shared by every mode that uses the same size
+    return ImageFont.truetype(path, size)
+
+
+@functools.cache
+def get_atlas(size: int, path: str = FONT_PATH) -> GlyphAtlas:
+    return GlyphAtlas(get_font(size, path))
+
+
+def font_key(font: ImageFont.FreeTypeFont) -> Hashable:
+    return (font.path, font.size)
 
 
 class DisplayMode:
+    # modes that change on their own (e.g. a running clock) set this and are
+    # re-rendered by DisplayManager while they are current
+    refresh_interval: float | None = None
+    # modes that move are re-rendered at the display's frame rate instead
+    animated = False
+
     def render(self, displayctl: DisplayControl):
         pass
 
 
-class MediaPlayerDisplayMode(DisplayMode):
-    font_path = str(RESOURCES_PATH.joinpath("Hack-Regular.ttf"))
-    default_font = ImageFont.truetype(font_path, 26)
+class CachedDisplayMode(DisplayMode, ABC):
+    # modes with a small, fixed set of possible screens. frames are drawn once
+    # and memoized in the display's frame cache, keyed by layout and content,
+    # already packed into the panel's format
+
+    def layout_key(self) -> Hashable:
+        return ()
+
+    @abstractmethod
+    def cache_key(self) -> Hashable:
+        pass
+
+    @abstractmethod
+    def draw(self, draw: ImageDraw.ImageDraw):
+        pass
+
+    def cached_frame(self, displayctl: DisplayControl):
+        key = (type(self).__name__, self.layout_key(), self.cache_key())
+        frame = displayctl.frame_cache.get(key)
+        if frame is None:
+            image = displayctl.new_frame()
+            self.draw(ImageDraw.Draw(image))
+            frame = pack_frame(image)
+            displayctl.frame_cache.put(key, frame)
+        return frame
 
-    def __init__(self, song_state: SongState, volume=None):
+    def render(self, displayctl: DisplayControl):
+        displayctl.show_frame(self.cached_frame(displayctl))
+
+
+class Marquee:
+    # a line of text rendered once into a strip wider than the screen, frames
+    # show a screen wide window of it. the strip repeats the start of the text
+    # after a gap so the window wraps around without a seam
+    GAP = "   "
+
+    def __init__(self, atlas: GlyphAtlas, text: str, fill, width: int):
+        loop = text + Marquee.GAP
+        self.period = int(sum(atlas.glyph(c).advance for c in loop))
+        self.width = width
+        mask, (left, self.top) = atlas.mask(loop + text)
+        image = Image.new("RGB", (self.period + width, mask.height))
+        ImageDraw.Draw(image).bitmap((left, 0), mask, fill=fill)
+        self.strip = pack_frame(image)
+        # pixels the text covers, packed colours can't be merged per channel
+        self.opaque = self.strip != 0
+        self.height = mask.height
+
+    def window(self, offset: int) -> Tuple[np.ndarray, np.ndarray]:
+        # (pixels, opaque) of the visible part
+        window = slice(offset, offset + self.width)
+        return self.strip[:, window], self.opaque[:, window]
+
+
+def format_time(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes}:{seconds:02}"
+
+
+class MediaPlayerDisplayMode(CachedDisplayMode):
+    font_size = 26
+    # rows of the progress bar and time, left blank by the track info layout
+    progress_rows = (160, 208)
+
+    def __init__(
+        self,
+        song_state: SongState,
+        volume=None,
+        progress=False,
+        marquee: MarqueeConfig | None = None,
+    ):
         self.song_state = song_state
         self.volume = volume
+        self.progress = progress
+        if progress:
+            self.refresh_interval = 1.0
+        # lines too long for the screen scroll instead of being cut off
+        self.marquee = marquee
+        self.scrolling = []
+        if marquee and marquee.enabled:
+            # fields are None without a current track or for some streams
+            lines = (song_state.artist, song_state.title, song_state.album)
+            self.scrolling = [(i, l) for i, l in enumerate(lines) if l and len(l) > 15]
+        self.animated = bool(self.scrolling)
+        self.started = time.monotonic()
+
+    def layout_key(self) -> Hashable:
+        return font_key(get_font(MediaPlayerDisplayMode.font_size))
+
+    def cache_key(self) -> Hashable:
+        s = self.song_state
+        scrolling = tuple(i for i, _ in self.scrolling)
+        return (s.artist, s.title, s.album, s.samplerate, self.volume, scrolling)
 
-    def render(self, displayctl: DisplayControl):
+    def draw(self, draw: ImageDraw.ImageDraw):
         def fit(s):
             CHARS = 15
+            s = s or ""
             if len(s) <= CHARS:
                 return s
             return f"{s:.15}"
 
         s = self.song_state
         samplerate = f"{float(s.samplerate)/1000}k" if s.samplerate else ""
-        # fmt: off
-        text = (
-            f"{s.artist:.15}\n"
-            f"{fit(s.title)}\n"
-            f"{fit(s.album)}\n"
-        )
-        # fmt: on
-        with displayctl.get_canvas() as draw:
-            draw.text(
-                (0, 0),
-                text,
-                font=MediaPlayerDisplayMode.default_font,
-                fill="white",
-                align="left",
-            )
-            draw.text(
-                (240 - len(samplerate) * 16, 208),
-                samplerate,
-                font=MediaPlayerDisplayMode.default_font,
-                fill="green",
-                align="right",
+        lines = [fit(s.artist), fit(s.title), fit(s.album)]
+        for i, _ in self.scrolling:
+            # drawn per frame by render
+            lines[i] = ""
+        text = "".join(f"{line}\n" for line in lines)
+        atlas = get_atlas(MediaPlayerDisplayMode.font_size)
+        atlas.draw(draw, (0, 0), text, fill="white")
+        atlas.draw(draw, (240 - len(samplerate) * 16, 208), samplerate, fill="green")
+        if self.volume:
+            volume_str = f"{self.volume:5}dB"
+            atlas.draw(draw, (0, 108), volume_str, fill="purple")
+
+    def draw_progress(self, draw: ImageDraw.ImageDraw):
+        # draws at the top of a strip that is placed at progress_rows
+        s = self.song_state
+        elapsed = s.elapsed()
+        top = 0
+        draw.rectangle((0, top, 239, top + 10), outline="grey")
+        if s.length:
+            draw.rectangle(
+                (0, top, int(239 * elapsed / s.length), top + 10), fill="grey"
             )
-            if self.volume:
-                volume_str = f"{self.volume:5}dB"
-                draw.text(
-                    (0, 108),
-                    volume_str,
-                    font=MediaPlayerDisplayMode.default_font,
-                    fill="purple",
-                    align="right",
-                )
+        get_atlas(MediaPlayerDisplayMode.font_size).draw(
+            draw,
+            (0, top + 12),
+            f"{format_time(elapsed)}/{format_time(s.length)}",
+            fill="grey",
+        )
 
+    def get_marquee(self, displayctl: DisplayControl, text: str) -> Marquee:
+        key = ("Marquee", self.layout_key(), text)
+        marquee = displayctl.frame_cache.get(key)
+        if marquee is None:
+            atlas = get_atlas(MediaPlayerDisplayMode.font_size)
+            width, _ = displayctl.display_size()
+            marquee = Marquee(atlas, text, "white", width)
+            displayctl.frame_cache.put(key, marquee)
+        return marquee
+
+    def scroll_offset(self, period: int) -> int:
+        # derived from the clock, not the frame count, so dropped frames
+        # don't slow the text down
+        speed, pause = self.marquee.speed, self.marquee.pause
+        t = (time.monotonic() - self.started) % (pause + period / speed)
+        return 0 if t < pause else int((t - pause) * speed) % period
 
-class VolumeDisplayMode(DisplayMode):
-    font_path = str(RESOURCES_PATH.joinpath("Hack-Regular.ttf"))
-    vol_font = ImageFont.truetype(font_path, 96)
-    db_font = ImageFont.truetype(font_path, 72)
+    def render(self, displayctl: DisplayControl):
+        # the track info is cached, only the progress strip and the windows of
+        # the scrolling lines are packed per tick
+        frame = self.cached_frame(displayctl)
+        if self.progress or self.scrolling:
+            frame = frame.copy()
+        if self.progress:
+            top, bottom = MediaPlayerDisplayMode.progress_rows
+            width, _ = displayctl.display_size()
+            strip = Image.new(displayctl.device.mode, (width, bottom - top))
+            self.draw_progress(ImageDraw.Draw(strip))
+            frame[top:bottom] = pack_frame(strip)
+        line_height = get_atlas(MediaPlayerDisplayMode.font_size).line_height
+        for i, text in self.scrolling:
+            # only the text's own pixels are copied, accents and descenders
+            # may share rows with the neighbouring lines or the progress strip
+            marquee = self.get_marquee(displayctl, text)
+            top = i * line_height + marquee.top
+            rows = frame[top : top + marquee.height]
+            window, opaque = marquee.window(self.scroll_offset(marquee.period))
+            np.copyto(rows, window, where=opaque)
+        displayctl.show_frame(frame)
+
+
+class VolumeDisplayMode(CachedDisplayMode):
+    vol_font_size = 96
+    db_font_size = 72
 
     def __init__(self, volume: float):
         if volume > -10.0:
@@ -78,135 +259,323 @@ class VolumeDisplayMode(DisplayMode):
         else:
             self.volume = f"{int(volume)}{'' if volume.is_integer() else '.'}"
 
-    def render(self, displayctl: DisplayControl):
-        with displayctl.get_canvas() as draw:
-            draw.text(
-                (0, 5),
-                f"{self.volume}",
-                font=VolumeDisplayMode.vol_font,
-                fill="white",
-            )
-            draw.text(
-                (120, 120),
-                f"dB",
-                font=VolumeDisplayMode.db_font,
-                fill="white",
-            )
+    def layout_key(self) -> Hashable:
+        return (
+            font_key(get_font(VolumeDisplayMode.vol_font_size)),
+            font_key(get_font(VolumeDisplayMode.db_font_size)),
+        )
+
+    def cache_key(self) -> Hashable:
+        return self.volume
+
+    def draw(self, draw: ImageDraw.ImageDraw):
+        get_atlas(VolumeDisplayMode.vol_font_size).draw(
+            draw, (0, 5), f"{self.volume}", fill="white"
+        )
+        get_atlas(VolumeDisplayMode.db_font_size).draw(
+            draw, (120, 120), f"dB", fill="white"
+        )
+
+
+class MessageDisplayMode(CachedDisplayMode):
+    # a line of text, e.g. while starting up
+    font_size = 36
+
+    def __init__(self, text: str):
+        self.text = text
+
+    def layout_key(self) -> Hashable:
+        return font_key(get_font(MessageDisplayMode.font_size))
+
+    def cache_key(self) -> Hashable:
+        return self.text
+
+    def draw(self, draw: ImageDraw.ImageDraw):
+        draw.text(
+            (120, 120),
+            self.text,
+            font=get_font(MessageDisplayMode.font_size),
+            fill="white",
+            anchor="mm",
+        )
 
 
 class AlbumArtDisplayMode(DisplayMode):
     default_image = str(RESOURCES_PATH.joinpath("default_album_art.png"))
 
-    def __init__(self, song_state: SongState):
+    def __init__(self, song_state: SongState, art_cache: AlbumArtCache):
         self.url = song_state.image_url
+        self.art_cache = art_cache
 
     def render(self, displayctl: DisplayControl):
-        try:
-            img_tmp_path = "/tmp/img-tmp"
-            urllib.request.urlretrieve(self.url, img_tmp_path)
-            displayctl.show_image(path=img_tmp_path)
-        except Exception as e:
-            logging.error("%s, %s", e, img_tmp_path)
-            displayctl.show_image(path=AlbumArtDisplayMode.default_image)
+        # frames are fetched ahead of time by DisplayManager.put_album_art, a
+        # miss here means the download failed or is still in flight
+        displayctl.show_frame(self.art_cache.get_or_default(self.url))
 
 
 class ImageGalleryDisplayMode(DisplayMode):
-    def __init__(self, cwd: Path, images: List[str]):
-        self.image_gallery = [cwd.joinpath("resources", f) for f in images]
-        self.gallery_index = 0
+    def __init__(self, gallery: Gallery, index: int = 0):
+        self.gallery = gallery
+        self.gallery_index = index
+        # slideshow, the image shown follows the clock from when the mode was
+        # put and refresh ticks just redraw it
+        self.refresh_interval = gallery.config.slideshow_interval
+        self.started = time.monotonic()
+
+    def current_index(self) -> int:
+        index = self.gallery_index
+        if self.refresh_interval:
+            # rounded, a tick that fires slightly early still advances
+            elapsed = time.monotonic() - self.started
+            index += int(elapsed / self.refresh_interval + 0.5)
+        return index % len(self.gallery)
 
     def render(self, displayctl: DisplayControl):
-        displayctl.show_image(
-            path=str(self.image_gallery[self.gallery_index]), stretch=True
-        )
-
-    def scroll_gallery(self) -> DisplayMode:
-        self.gallery_index = (self.gallery_index + 1) % len(self.image_gallery)
-        return self
+        displayctl.show_frame(self.gallery.get(self.current_index()))
 
 
-class InputDisplayMode(DisplayMode):
-    font_path = str(RESOURCES_PATH.joinpath("Hack-Regular.ttf"))
-    input_font = ImageFont.truetype(font_path, 72)
-    vol_font = ImageFont.truetype(font_path, 36)
+class InputDisplayMode(CachedDisplayMode):
+    input_font_size = 72
+    vol_font_size = 36
 
     def __init__(self, state: ControlState):
-        self.state = state
+        # copied, the state keeps changing while the render thread draws
+        self.input_name = state.input.name
+        self.input_mode = state.input_mode
+        self.volume = state.volume
+
+    def layout_key(self) -> Hashable:
+        return (
+            font_key(get_font(InputDisplayMode.input_font_size)),
+            font_key(get_font(InputDisplayMode.vol_font_size)),
+        )
 
-    def render(self, displayctl: DisplayControl):
-        with displayctl.get_canvas() as draw:
-            draw.text(
-                (0, 20),
-                f"{self.state.input.name}"[:5],
-                font=InputDisplayMode.input_font,
-                fill="white",
-            )
-            draw.text(
-                (0, 190),
-                f"{self.state.volume}",
-                font=InputDisplayMode.vol_font,
-                fill="white",
-            )
+    def cache_key(self) -> Hashable:
+        return (self.input_name, self.input_mode, self.volume)
 
-            outline_width = 5
-            left = 170
-            bottom = 230
-            match self.state.input_mode:
-                case InputMode.EQ:
-                    draw.ellipse(
-                        (left, bottom - 60, left + 60, bottom),
-                        fill="blue",
-                        outline="magenta",
-                        width=outline_width,
-                    )
-                case InputMode.EQ_ALT:
-                    draw.polygon(
-                        (left, bottom, left + 60, bottom, left + 30, bottom - 60),
-                        fill="red",
-                        outline="brown",
-                        width=outline_width,
-                    )
-                case _:
-                    draw.rectangle(
-                        (left, bottom - 60, left + 60, bottom),
-                        fill="green",
-                        outline="cyan",
-                        width=outline_width,
-                    )
+    def draw(self, draw: ImageDraw.ImageDraw):
+        get_atlas(InputDisplayMode.input_font_size).draw(
+            draw, (0, 20), f"{self.input_name}"[:5], fill="white"
+        )
+        get_atlas(InputDisplayMode.vol_font_size).draw(
+            draw, (0, 190), f"{self.volume}", fill="white"
+        )
+
+        outline_width = 5
+        left = 170
+        bottom = 230
+        match self.input_mode:
+            case InputMode.EQ:
+                draw.ellipse(
+                    (left, bottom - 60, left + 60, bottom),
+                    fill="blue",
+                    outline="magenta",
+                    width=outline_width,
+                )
+            case InputMode.EQ_ALT:
+                draw.polygon(
+                    (left, bottom, left + 60, bottom, left + 30, bottom - 60),
+                    fill="red",
+                    outline="brown",
+                    width=outline_width,
+                )
+            case _:
+                draw.rectangle(
+                    (left, bottom - 60, left + 60, bottom),
+                    fill="green",
+                    outline="cyan",
+                    width=outline_width,
+                )
 
 
 class DisplayQueue:
     def __init__(self, displayctl: DisplayControl):
         self.displayctl = displayctl
-        self.q: asyncio.Queue = asyncio.Queue()
+        self.displayctl.abandon = self.has_newer
+        # latest-wins mailbox. the render worker only ever sees the most
+        # recent mode, anything put while a frame is in flight replaces it
+        self.cond = threading.Condition()
+        self.mode: DisplayMode | None = None
+        self.generation = 0
+        self.rendering = 0
+        self.drawing = False
+        self.stopped = False
+        self.worker: threading.Thread | None = None
 
     def put(self, mode: DisplayMode):
-        self.q.put_nowait(mode)
-
-    async def refresh_loop(self):
-        while True:
+        with self.cond:
+            if self.mode is not None:
+                SUPERSEDED.inc()
+            self.mode = mode
+            self.generation += 1
+            QUEUE_DEPTH.set(self.generation - self.rendering)
+            self.cond.notify()
+
+    def has_newer(self) -> bool:
+        return self.generation != self.rendering
+
+    def busy(self) -> bool:
+        # a mode is waiting or being rendered
+        return self.mode is not None or self.drawing
+
+    def take(self) -> DisplayMode | None:
+        with self.cond:
+            self.cond.wait_for(lambda: self.mode is not None or self.stopped)
+            mode, self.mode = self.mode, None
+            self.rendering = self.generation
+            self.drawing = mode is not None
+            QUEUE_DEPTH.set(0)
+            return mode
+
+    def render_loop(self):
+        while not self.stopped:
             try:
-                async with asyncio.timeout(600):
-                    mode = await self.q.get()
-                    while not self.q.empty():
-                        mode = await self.q.get()
-
-                    assert isinstance(mode, DisplayMode)
+                mode = self.take()
+                if mode is None:
+                    continue
+                assert isinstance(mode, DisplayMode)
+                with RENDER_SECONDS.time(mode=type(mode).__name__):
                     mode.render(self.displayctl)
-                    self.q.task_done()
-            except TimeoutError:
-                self.displayctl.clear()
+            except Exception:
+                logging.exception("render failed")
+            finally:
+                self.drawing = False
+
+    def stop(self):
+        with self.cond:
+            self.stopped = True
+            self.cond.notify()
+
+    def start(self):
+        # the render worker runs as soon as the display is up, ahead of
+        # refresh_loop, so the first frame isn't held back by other startup
+        if self.worker is None:
+            self.worker = threading.Thread(
+                target=self.render_loop, name="display", daemon=True
+            )
+            self.worker.start()
+
+    async def refresh_loop(self):
+        self.start()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            self.stop()
+            self.worker.join()
 
 
 class DisplayManager:
-    def __init__(self):
-        self.queue = DisplayQueue(DisplayControl(type=DisplayType.LCD))
+    def __init__(self, config: dict | None = None):
+        config = config or {}
+        display_config = config.get("display", {})
+        self.queue = DisplayQueue(
+            DisplayControl(
+                type=DisplayType[display_config.get("type", "LCD")],
+                frame_cache_size=display_config.get("frame_cache_size", 64),
+                framebuffer=display_config.get("framebuffer", "/dev/fb1"),
+                backlight_pwm_hz=display_config.get("backlight_pwm_hz"),
+                rotate=display_config.get("rotate", 0),
+            )
+        )
+        # 0-255, while active and while dimmed
+        self.brightness = display_config.get("brightness", 192)
+        self.dim_brightness = display_config.get("dim_brightness", 32)
+        self.queue.displayctl.set_brightness(self.brightness)
+        self.art_cache = AlbumArtCache(
+            config.get("album_art", {}),
+            display_size=self.queue.displayctl.display_size(),
+            default_image=AlbumArtDisplayMode.default_image,
+        )
+        self.animation = AnimationConfig(
+            fps=display_config.get("fps", 20),
+            bandwidth=display_config.get("bandwidth", 2000000),
+        )
+        marquee_config = display_config.get("marquee", {})
+        self.marquee = MarqueeConfig(
+            enabled=marquee_config.get("enabled", True),
+            speed=marquee_config.get("speed", 40),
+            pause=marquee_config.get("pause", 2.0),
+        )
+        images = config.get("image_gallery") or []
+        self.gallery = (
+            Gallery(
+                [RESOURCES_PATH.joinpath(f) for f in images],
+                size=self.queue.displayctl.display_size(),
+                config=config.get("gallery", {}),
+            )
+            if images
+            else None
+        )
         self.pending_revert = None
+        self.refresh_task = None
         self.current = None
+        # the latest mode asked for, album art becomes current only once its
+        # download is done
+        self.pending = None
 
     def put(self, mode: DisplayMode):
+        self.pending = mode
         self.current = mode
         self.queue.put(mode)
+        if mode.refresh_interval or mode.animated:
+            self.refresh_task = asyncio.create_task(self.refresh_while_current(mode))
+
+    def frame_interval(self, mode: DisplayMode) -> float:
+        if not mode.animated:
+            return mode.refresh_interval
+        # keep the animation's share of the panel's bus under the budget
+        frame_bytes = self.queue.displayctl.frame_bytes
+        return max(1 / self.animation.fps, frame_bytes / self.animation.bandwidth)
+
+    async def refresh_while_current(self, mode: DisplayMode):
+        # frame scheduler. ticks are paced from deadlines so render time
+        # doesn't add up, an animation tick that finds the previous frame
+        # still queued or rendering is dropped rather than piling up
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
+        while True:
+            interval = self.frame_interval(mode)
+            deadline += interval
+            await asyncio.sleep(deadline - loop.time())
+            if self.current is not mode:
+                return
+            # don't draw over a temporary mode such as the volume overlay
+            if self.pending_revert and not self.pending_revert.done():
+                continue
+            if self.queue.displayctl.asleep:
+                continue
+            if not mode.animated:
+                self.queue.put(mode)
+                continue
+            late = loop.time() - deadline
+            if late > interval:
+                # the loop was blocked, skip the ticks that were missed
+                DROPPED_FRAMES.inc(int(late // interval))
+                deadline = loop.time()
+            if self.queue.busy():
+                DROPPED_FRAMES.inc()
+                continue
+            self.queue.put(mode)
+
+    async def set_power(self, state: PowerState) -> None:
+        # panel commands wait for a frame in flight, off the event loop
+        displayctl = self.queue.displayctl
+        match state:
+            case PowerState.SLEEPING:
+                await asyncio.to_thread(displayctl.sleep)
+            case PowerState.DIMMED:
+                await asyncio.to_thread(displayctl.wake, self.dim_brightness)
+            case _:
+                await asyncio.to_thread(displayctl.wake, self.brightness)
+
+    async def put_album_art(self, song_state: SongState):
+        mode = AlbumArtDisplayMode(song_state, self.art_cache)
+        self.pending = mode
+        await self.art_cache.fetch(song_state.image_url)
+        # a newer mode may have been put while the art was downloading. until
+        # now an overlay reverts to the previous mode, not to missing art
+        if self.pending is mode:
+            self.put(mode)
 
     def put_temp(self, mode: DisplayMode):
         if self.pending_revert:
@@ -1,6 +1,10 @@
 import asyncio
+import logging
 import pigpio
+import threading
 
+from typing import Callable, NamedTuple, Tuple
+from metrics import REGISTRY
 from remote import RemoteControl, RemoteButton
 
 GPIO_A = 27
@@ -8,28 +12,60 @@ GPIO_B = 4
 GPIO_SW = 25
 DEBOUNCE = 300
 
-GPIO_MAPPING = {
-    GPIO_A: ["d", "D"],
-    GPIO_B: ["c", "C"],
-}
-SEQUENCE_UP = ("CdcD", "dcDC", "cDCd", "DCdc")
-SEQUENCE_DOWN = ("CDcd", "DcdC", "cdCD", "dCDc")
-SEQ_LENGTH = 4
+# detents per second -> dB per detent. the fastest matching row applies
+DEFAULT_ACCELERATION = ((0, 0.5), (8, 1.0), (16, 2.0), (30, 4.0))
+
+# quadrature state is (A << 1) | B. turning up, A leads B through
+# 11 -> 01 -> 00 -> 10 -> 11 and the encoder rests at 11 and 00
+UP_SEQUENCE = (0b11, 0b01, 0b00, 0b10)
+REST_STATES = (0b11, 0b00)
+
+
+def transition_table() -> Tuple[int, ...]:
+    # indexed by (previous << 2) | current, +1/-1 is one edge up/down. an edge
+    # lost to the glitch filter shows up as a repeated level, i.e. 0, and the
+    # count falls back in step at the next rest position
+    table = [0] * 16
+    for i, state in enumerate(UP_SEQUENCE):
+        following = UP_SEQUENCE[(i + 1) % 4]
+        table[state << 2 | following] = 1
+        table[following << 2 | state] = -1
+    return tuple(table)
+
+
+TRANSITIONS = transition_table()
+BATCHES = REGISTRY.counter(
+    "pi_player_encoder_batches_total", "Encoder batches delivered to the event loop"
+)
+DETENTS = REGISTRY.counter("pi_player_encoder_detents_total", "Encoder detents")
+
+
+class EncoderConfig(NamedTuple):
+    acceleration: Tuple[Tuple[float, float], ...]
+    # weight of the latest detent in the smoothed velocity
+    smoothing: float
+    # seconds during which further detents are folded into one volume step
+    batch_interval: float
+    # detents of a spin that stay at the finest step, however fast
+    warmup: int
+    # most dB a single batch may change the volume by
+    max_batch_db: float
 
 
 class RotaryEncoder:
     def __init__(
         self,
-        up_callback=None,
-        down_callback=None,
+        rotate_callback=None,
         sw_callback=None,
+        pi: pigpio.pi | None = None,
     ):
-        self.up_callback = up_callback
-        self.down_callback = down_callback
+        self.rotate_callback = rotate_callback
         self.sw_callback = sw_callback
-        self.sequence = SEQUENCE_UP[0]
+        self.state = 0b11
+        self.edges = 0
+        self.last_tick: int | None = None
 
-        self.pi = pigpio.pi()
+        self.pi = pi or pigpio.pi()
 
         def setup_gpio(gpio):
             self.pi.set_glitch_filter(gpio, DEBOUNCE)
@@ -43,46 +79,153 @@ class RotaryEncoder:
         self.pi.set_pull_up_down(GPIO_SW, pigpio.PUD_UP)
         self.pi.callback(GPIO_SW, pigpio.FALLING_EDGE, self.sw_gpio_fall)
 
-    def append_seq(self, s: str) -> None:
-        self.sequence += s
-        if len(self.sequence) >= SEQ_LENGTH:
-            self.sequence = self.sequence[-SEQ_LENGTH:]
-
     def rotary_callback(self, gpio, level, tick):
-        self.append_seq(GPIO_MAPPING[gpio][level])
-        if level:
-            if self.sequence in (SEQUENCE_UP):
-                self.up_callback()
-            elif self.sequence in (SEQUENCE_DOWN):
-                self.down_callback()
+        # runs on the pigpio thread for every edge
+        bit = 0b10 if gpio == GPIO_A else 0b01
+        state = self.state | bit if level else self.state & ~bit
+        self.edges += TRANSITIONS[self.state << 2 | state]
+        self.state = state
+
+        # a detent is counted once the encoder is back at rest, so bounces
+        # that return to where they started cancel out
+        if state not in REST_STATES or not self.edges:
+            return
+        direction = 1 if self.edges > 0 else -1
+        self.edges = 0
+        interval = None
+        if self.last_tick is not None:
+            interval = ((tick - self.last_tick) & 0xFFFFFFFF) / 1000000
+        self.last_tick = tick
+        self.rotate_callback(direction, interval)
 
     def sw_gpio_fall(self, a, b, c):
         self.sw_callback()
 
 
-class EncoderControl:
-    def __init__(self, remotectl: RemoteControl):
-        self.main_loop = asyncio.get_event_loop()
+class EncoderBridge:
+    # hands encoder input from the pigpio thread to the event loop. detents
+    # and presses are summed under a lock and the loop is only woken when
+    # nothing is scheduled yet. the first batch is delivered right away, then
+    # whatever accumulates is delivered once per interval until input stops
 
-        def switch_cb():
-            asyncio.run_coroutine_threadsafe(
-                remotectl.handle_keypress(RemoteButton.GT_TEN), loop=self.main_loop
-            )
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        deliver: Callable[[float, int], None],
+        interval: float,
+    ):
+        self.loop = loop
+        self.deliver = deliver
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.delta = 0.0
+        self.detents = 0
+        self.presses = 0
+        self.scheduled = False
+
+    def add(self, delta: float = 0.0, presses: int = 0) -> None:
+        with self.lock:
+            self.delta += delta
+            self.detents += delta != 0
+            self.presses += presses
+            if self.scheduled:
+                return
+            self.scheduled = True
+        self.loop.call_soon_threadsafe(self.drain)
+
+    def drain(self) -> None:
+        with self.lock:
+            delta, detents, presses = self.delta, self.detents, self.presses
+            self.delta, self.detents, self.presses = 0.0, 0, 0
+            if not detents and not presses:
+                self.scheduled = False
+                return
+        BATCHES.inc()
+        DETENTS.inc(detents)
+        logging.debug("encoder batch. %d detents, %+.1fdB", detents, delta)
+        self.deliver(delta, presses)
+        self.loop.call_later(self.interval, self.drain)
 
-        def up_cb():
-            asyncio.run_coroutine_threadsafe(
-                remotectl.handle_keypress(RemoteButton.TUNE_UP, force=True),
-                loop=self.main_loop,
-            )
 
-        def down_cb():
-            asyncio.run_coroutine_threadsafe(
-                remotectl.handle_keypress(RemoteButton.TUNE_DOWN, force=True),
-                loop=self.main_loop,
-            )
+class EncoderControl:
+    # a pause longer than this starts the next spin at the slowest step
+    IDLE_INTERVAL = 0.5
+
+    def __init__(
+        self,
+        remotectl: RemoteControl,
+        config: dict | None = None,
+        pi: pigpio.pi | None = None,
+    ):
+        config = config or {}
+        self.main_loop = asyncio.get_event_loop()
+        self.remotectl = remotectl
+        self.config = EncoderConfig(
+            acceleration=tuple(
+                sorted(
+                    (float(v), float(db))
+                    for v, db in config.get("acceleration", DEFAULT_ACCELERATION)
+                )
+            ),
+            smoothing=config.get("smoothing", 0.5),
+            batch_interval=config.get("batch_interval", 0.03),
+            warmup=config.get("warmup", 4),
+            max_batch_db=config.get("max_batch_db", 3.0),
+        )
+        self.velocity = 0.0
+        self.direction = 0
+        # detents in the current spin and the acceleration row reached
+        self.spin = 0
+        self.row = 0
+        self.bridge = EncoderBridge(
+            self.main_loop, self.deliver, self.config.batch_interval
+        )
+
+        def rotate_cb(direction: int, interval: float | None):
+            self.bridge.add(delta=direction * self.step_size(direction, interval))
 
         self.rotary = RotaryEncoder(
-            up_callback=up_cb,
-            down_callback=down_cb,
-            sw_callback=switch_cb,
+            rotate_callback=rotate_cb,
+            sw_callback=lambda: self.bridge.add(presses=1),
+            pi=pi,
         )
+
+    def deliver(self, delta: float, presses: int) -> None:
+        # runs on the event loop, once per batch
+        self.remotectl.ctl.power.activity()
+        if delta:
+            limit = self.config.max_batch_db
+            delta = max(-limit, min(limit, delta))
+            self.main_loop.create_task(self.remotectl.ctl.volume_step(delta))
+        for _ in range(presses):
+            self.remotectl.press(RemoteButton.GT_TEN)
+
+    def step_size(self, direction: int, interval: float | None) -> float:
+        # velocity in detents per second, smoothed over the last few detents
+        # starting from 0. reversing or pausing drops back to the finest step.
+        # a spin stays there for the first `warmup` detents and then climbs
+        # at most one acceleration row per detent, so a quick flick can't
+        # jump the volume
+        if (
+            interval is None
+            or direction != self.direction
+            or interval > EncoderControl.IDLE_INTERVAL
+        ):
+            self.velocity = 0.0
+            self.spin = 0
+            self.row = 0
+        else:
+            instant = 1 / max(interval, 0.001)
+            alpha = self.config.smoothing
+            self.velocity = alpha * instant + (1 - alpha) * self.velocity
+        self.direction = direction
+        self.spin += 1
+
+        target = 0
+        for i, (velocity, _) in enumerate(self.config.acceleration):
+            if self.velocity >= velocity:
+                target = i
+        if self.spin <= self.config.warmup:
+            target = 0
+        self.row = min(target, self.row + 1)
+        return self.config.acceleration[self.row][1]
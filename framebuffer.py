@@ -0,0 +1,99 @@
+import fcntl
+import logging
+import mmap
+import os
+
+from pathlib import Path
+from typing import NamedTuple, Tuple
+import numpy as np
+from display import unpack_rgb565
+
+"""
+Panels driven by a kernel framebuffer driver such as fbtft. Frames are copied
+into the memory mapped /dev/fbN and the driver does the SPI transfer in the
+kernel, off the interpreter. fbtft's deferred io only sends the pages that
+were written, so partial writes stay partial.
+"""
+
+# linux/fb.h
+FBIOBLANK = 0x4611
+FB_BLANK_UNBLANK = 0
+FB_BLANK_POWERDOWN = 4
+
+
+class FramebufferGeometry(NamedTuple):
+    width: int
+    height: int
+    bits_per_pixel: int
+    # bytes per row, may include padding
+    stride: int
+
+    @staticmethod
+    def from_sysfs(path: str) -> "FramebufferGeometry":
+        sysfs = Path("/sys/class/graphics", Path(path).name)
+        width, height = sysfs.joinpath("virtual_size").read_text().split(",")
+        return FramebufferGeometry(
+            width=int(width),
+            height=int(height),
+            bits_per_pixel=int(sysfs.joinpath("bits_per_pixel").read_text()),
+            stride=int(sysfs.joinpath("stride").read_text()),
+        )
+
+
+class FramebufferDevice:
+    # the subset of a luma device used by DisplayControl, plus write(). any
+    # file can stand in for /dev/fbN when the geometry is given
+    mode = "RGB"
+
+    def __init__(
+        self, path: str = "/dev/fb1", geometry: FramebufferGeometry | None = None
+    ):
+        self.geometry = geometry or FramebufferGeometry.from_sysfs(path)
+        g = self.geometry
+        if g.bits_per_pixel not in (16, 32):
+            raise ValueError(f"unsupported framebuffer format, {g.bits_per_pixel}bpp")
+        self.size: Tuple[int, int] = (g.width, g.height)
+        self.fd = os.open(path, os.O_RDWR)
+        self.map = mmap.mmap(self.fd, g.stride * g.height)
+        # 16bpp is RGB565 in host byte order, 32bpp is XRGB8888, i.e. the
+        # bytes B, G, R, X on little endian
+        if g.bits_per_pixel == 16:
+            shape, dtype = (g.height, g.stride // 2), np.dtype("=u2")
+        else:
+            shape, dtype = (g.height, g.stride // 4, 4), np.dtype(np.uint8)
+        self.pixels = np.ndarray(shape, dtype=dtype, buffer=self.map)
+
+    def write(self, frame: np.ndarray, box: Tuple[int, int, int, int]) -> int:
+        # frame is packed RGB565 big endian, see display.pack_frame. returns
+        # the number of bytes written to the framebuffer
+        left, top, right, bottom = box
+        region = frame[top:bottom, left:right]
+        if self.geometry.bits_per_pixel == 16:
+            # the byte swap happens in numpy's copy
+            self.pixels[top:bottom, left:right] = region
+        else:
+            rgb = unpack_rgb565(region)
+            self.pixels[top:bottom, left:right, 2::-1] = rgb
+        return region.size * self.geometry.bits_per_pixel // 8
+
+    def blank(self, mode: int) -> None:
+        try:
+            fcntl.ioctl(self.fd, FBIOBLANK, mode)
+        except OSError as e:
+            # plain files and drivers without blanking support
+            logging.debug("framebuffer blank failed. %s", e)
+
+    def hide(self) -> None:
+        self.blank(FB_BLANK_POWERDOWN)
+
+    def show(self) -> None:
+        self.blank(FB_BLANK_UNBLANK)
+
+    def contrast(self, level: int) -> None:
+        # the backlight belongs to the kernel driver
+        pass
+
+    def cleanup(self) -> None:
+        del self.pixels
+        self.map.close()
+        os.close(self.fd)
@@ -0,0 +1,110 @@
+import logging
+import mmap
+import tempfile
+import threading
+
+from pathlib import Path
+from typing import List, NamedTuple, Tuple
+import numpy as np
+from PIL import Image
+from display import FrameCache, fit_image, pack_frame
+from metrics import REGISTRY
+
+GALLERY_LOADS = REGISTRY.counter(
+    "pi_player_gallery_loads_total", "Gallery frames served, by where they came from"
+)
+
+
+class GalleryConfig(NamedTuple):
+    # seconds per image, None only advances on key presses
+    slideshow_interval: float | None
+    # bytes of frames kept in memory
+    memory_budget: int
+    # evicted frames are kept in a memory mapped temporary file
+    spill: bool
+
+
+class Gallery:
+    # display-sized frames of the gallery images. a background thread scales
+    # every image once, ahead of being shown. the most recently used frames
+    # stay in memory up to the budget, the rest are read back from the spill
+    # file, which the page cache keeps warm. only a frame that hasn't been
+    # scaled yet is decoded on demand
+
+    def __init__(self, paths: List[Path], size: Tuple[int, int], config: dict):
+        self.paths = paths
+        self.size = size
+        self.config = GalleryConfig(
+            slideshow_interval=config.get("slideshow_interval", 10),
+            memory_budget=int(config.get("memory_budget", 8) * 1024 * 1024),
+            spill=config.get("spill", True),
+        )
+        width, height = size
+        self.frame_bytes = width * height * 2
+        self.frames = FrameCache(max(1, self.config.memory_budget // self.frame_bytes))
+        self.lock = threading.Lock()
+        self.spilled = [False] * len(paths)
+        self.spill = None
+        self.worker: threading.Thread | None = None
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def start(self) -> None:
+        if self.worker is None and self.paths:
+            self.worker = threading.Thread(
+                target=self.preload, name="gallery", daemon=True
+            )
+            self.worker.start()
+
+    def preload(self) -> None:
+        if self.config.spill:
+            # unlinked on creation, the space is freed with the process
+            with tempfile.TemporaryFile(prefix="pi_player_gallery") as f:
+                f.truncate(self.frame_bytes * len(self.paths))
+                self.spill = mmap.mmap(f.fileno(), self.frame_bytes * len(self.paths))
+        for index in range(len(self.paths)):
+            with self.lock:
+                if self.spilled[index]:
+                    continue
+            try:
+                self.store(index, self.load(index))
+            except Exception as e:
+                logging.error("gallery load failed. %s, %s", e, self.paths[index])
+        logging.info("gallery preloaded. %d images", len(self.paths))
+
+    def load(self, index: int) -> np.ndarray:
+        with Image.open(self.paths[index], formats=["JPEG", "PNG"]) as image:
+            # lets libjpeg decode large photos at a fraction of their size
+            image.draft("RGB", self.size)
+            return pack_frame(fit_image(image, self.size, stretch=True))
+
+    def store(self, index: int, frame: np.ndarray) -> None:
+        with self.lock:
+            if self.spill is not None and not self.spilled[index]:
+                offset = index * self.frame_bytes
+                self.spill[offset : offset + self.frame_bytes] = frame.tobytes()
+                self.spilled[index] = True
+            self.frames.put(index, frame)
+
+    def get(self, index: int) -> np.ndarray:
+        with self.lock:
+            frame = self.frames.get(index)
+            if frame is not None:
+                GALLERY_LOADS.inc(source="memory")
+                return frame
+            if self.spilled[index]:
+                GALLERY_LOADS.inc(source="spill")
+                width, height = self.size
+                frame = np.ndarray(
+                    (height, width),
+                    dtype=">u2",
+                    buffer=self.spill,
+                    offset=index * self.frame_bytes,
+                )
+                self.frames.put(index, frame)
+                return frame
+        GALLERY_LOADS.inc(source="decode")
+        frame = self.load(index)
+        self.store(index, frame)
+        return frame
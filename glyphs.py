@@ -0,0 +1,77 @@
+import numpy as np
+
+from typing import Dict, NamedTuple, Tuple
+from PIL import Image, ImageDraw, ImageFont
+
+"""
+Text drawn from cached glyph masks instead of a FreeType layout per call. Hack
+is monospaced and its hinted advances are whole pixels, so blitting the glyph
+masks side by side gives the same mask FreeType renders for the whole string.
+"""
+
+# pixels between lines, same as ImageDraw.multiline_text
+LINE_SPACING = 4
+
+
+class Glyph(NamedTuple):
+    mask: np.ndarray
+    # top left of the mask relative to the pen position on the ascender line
+    offset: Tuple[int, int]
+    advance: float
+
+
+class GlyphAtlas:
+    # glyphs are rasterized once, the first time a string uses them, so only
+    # the characters a screen actually shows are ever rendered
+
+    def __init__(self, font: ImageFont.FreeTypeFont):
+        self.font = font
+        self.glyphs: Dict[str, Glyph] = {}
+        self.line_height = font.getbbox("A")[3] + LINE_SPACING
+
+    def glyph(self, char: str) -> Glyph:
+        glyph = self.glyphs.get(char)
+        if glyph is None:
+            mask, offset = self.font.getmask2(char, "L", anchor="la")
+            width, height = mask.size
+            pixels = np.array(mask, dtype=np.uint8).reshape(height, width)
+            glyph = Glyph(pixels, offset, self.font.getlength(char))
+            self.glyphs[char] = glyph
+        return glyph
+
+    def mask(self, text: str) -> Tuple[Image.Image, Tuple[int, int]] | None:
+        # same result as font.getmask2(text, "L", anchor="la"), None when
+        # nothing would be drawn
+        placed = []
+        pen = 0.0
+        for char in text:
+            glyph = self.glyph(char)
+            if glyph.mask.size:
+                x, y = glyph.offset
+                placed.append((glyph.mask, int(pen) + x, y))
+            pen += glyph.advance
+        if not placed:
+            return None
+
+        left = min(x for _, x, _ in placed)
+        top = min(y for _, _, y in placed)
+        right = max(x + m.shape[1] for m, x, _ in placed)
+        bottom = max(y + m.shape[0] for m, _, y in placed)
+        canvas = np.zeros((bottom - top, right - left), dtype=np.uint8)
+        for m, x, y in placed:
+            h, w = m.shape
+            region = canvas[y - top : y - top + h, x - left : x - left + w]
+            np.maximum(region, m, out=region)
+        return Image.fromarray(canvas, "L"), (left, top)
+
+    def draw(
+        self, draw: ImageDraw.ImageDraw, xy: Tuple[int, int], text: str, fill
+    ) -> None:
+        # left aligned, anchored at the top left like draw.text's default
+        x, y = xy
+        for i, line in enumerate(text.split("\n")):
+            rendered = self.mask(line)
+            if rendered is None:
+                continue
+            mask, (ox, oy) = rendered
+            draw.bitmap((x + ox, y + i * self.line_height + oy), mask, fill=fill)
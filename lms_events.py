@@ -0,0 +1,59 @@
+import asyncio
+import logging
+
+from typing import Callable, List
+from urllib.parse import unquote
+
+# notifications that can change what is playing. mixer, prefset etc. are noise
+SUBSCRIBE = ("playlist", "pause", "play", "stop", "mode", "power", "client")
+MIN_BACKOFF: float = 1.0
+MAX_BACKOFF: float = 30.0
+
+
+def parse_notification(line: bytes) -> List[str]:
+    return [unquote(t) for t in line.decode(errors="replace").split()]
+
+
+class LMSEventListener:
+    # subscribes to player notifications on the LMS CLI (telnet, port 9090)
+    # and calls `on_event` for every notification about `player_id`
+
+    def __init__(self, host: str, port: int, on_event: Callable[[List[str]], None]):
+        self.host = host
+        self.port = port
+        self.on_event = on_event
+        self.player_id: str | None = None
+        self.connected = False
+
+    async def listen(self, player_id: str) -> None:
+        self.player_id = player_id.lower()
+        backoff = MIN_BACKOFF
+        while True:
+            try:
+                await self.subscribe()
+                backoff = MIN_BACKOFF
+            except (OSError, asyncio.IncompleteReadError) as e:
+                logging.warning("lms events disconnected. %s", e)
+            finally:
+                self.connected = False
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, MAX_BACKOFF)
+
+    async def subscribe(self) -> None:
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            writer.write(f"subscribe {','.join(SUBSCRIBE)}\n".encode())
+            await writer.drain()
+            # the server echoes the subscribe command back
+            await reader.readline()
+            self.connected = True
+            logging.info("lms events subscribed. %s:%d", self.host, self.port)
+
+            while line := await reader.readline():
+                tokens = parse_notification(line)
+                if len(tokens) < 2 or tokens[0].lower() != self.player_id:
+                    continue
+                logging.debug("lms event. %s", tokens[1:])
+                self.on_event(tokens[1:])
+        finally:
+            writer.close()
@@ -6,8 +6,8 @@ import yaml
 
 from pathlib import Path
 from control import Control
-from display_modes import DisplayManager
 from encoder import EncoderControl
+from metrics import MetricsServer, startup_milestone
 from remote import RemoteControl
 from squeezebox import SqueezeboxControl
 
@@ -21,6 +21,11 @@ async def main():
         choices=["DEBUG", "INFO", "WARNING", "ERROR"],
     )
     parser.add_argument("--config-file", help="path to config file")
+    parser.add_argument(
+        "--simulate",
+        action="store_true",
+        help="run against simulated hardware and servers",
+    )
     args = parser.parse_args()
     logging.basicConfig(level=args.log)
 
@@ -30,23 +35,51 @@ async def main():
     )
     config = yaml.safe_load(config_file.read_text())
 
+    sim = None
+    if args.simulate or config.get("simulate"):
+        from simulator import Simulator
+
+        sim = Simulator(config)
+        config = sim.apply(config)
+        await sim.start(config)
+
     ctl = None
+    squeezectl = None
     try:
         ctl = Control(config)
         squeezectl = SqueezeboxControl(config["squeezebox"], ctl)
-        remotectl = RemoteControl(config["remote"], ctl, mediactl=squeezectl)
-        EncoderControl(remotectl)
+        # LMS discovery runs while camilladsp and the display come up
+        squeezectl.start()
+        await ctl.connect()
+        remotectl = RemoteControl(
+            config["remote"],
+            ctl,
+            mediactl=squeezectl,
+            device=sim.input_device if sim else None,
+        )
+        EncoderControl(remotectl, config.get("encoder", {}), pi=sim.pi if sim else None)
+        metrics_server = MetricsServer(config.get("metrics", {}))
 
-        await asyncio.gather(
+        loops = [
             squeezectl.refresh_loop(),
             remotectl.refresh_loop(),
             ctl.display_manager.queue.refresh_loop(),
-        )
+            ctl.power.refresh_loop(),
+            metrics_server.refresh_loop(),
+        ]
+        if sim:
+            loops.append(sim.stdin_loop())
+        startup_milestone("ready")
+        await asyncio.gather(*loops)
     except asyncio.exceptions.CancelledError:
         pass
     finally:
+        if squeezectl:
+            await squeezectl.close()
         if ctl:
-            ctl.display_manager.queue.displayctl.close()
+            ctl.close()
+        if sim:
+            await sim.stop()
 
 
 if __name__ == "__main__":
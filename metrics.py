@@ -0,0 +1,254 @@
+import asyncio
+import bisect
+import functools
+import inspect
+import logging
+import os
+import threading
+import time
+
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, List, NamedTuple, Tuple
+
+if TYPE_CHECKING:
+    from aiohttp import web
+
+"""
+In-process counters, gauges and histograms exposed in the Prometheus text
+format. Recording is a dict lookup and a few additions under a lock so it is
+always on, the http endpoint is optional.
+"""
+
+# seconds, from sub-millisecond SPI writes to multi-second http requests
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in labels) + "}"
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Span:
+    # times a block into a histogram, works with both `with` and `async with`.
+    # awaits inside the block are included, i.e. this is wall clock latency
+
+    def __init__(self, histogram: "Metric", labels: Dict[str, str]):
+        self.histogram = histogram
+        self.labels = labels
+        self.start = 0.0
+
+    def __enter__(self) -> "Span":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+    async def __aenter__(self) -> "Span":
+        return self.__enter__()
+
+    async def __aexit__(self, *exc) -> None:
+        self.__exit__(*exc)
+
+
+class Metric:
+    def __init__(self, name: str, kind: str, help: str, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.kind = kind
+        self.help = help
+        self.buckets = tuple(buckets)
+        # counter/gauge series hold a float, histogram series hold the
+        # per-bucket counts followed by the sum and the total count
+        self.series: Dict[Labels, float | List[float]] = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.series[key] = self.series.get(key, 0) + amount
+
+    def set(self, value: float, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.series[key] = value
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [0] * (len(self.buckets) + 3)
+            series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def time(self, **labels) -> Span:
+        return Span(self, labels)
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        with self.lock:
+            series = {
+                k: v[:] if isinstance(v, list) else v for k, v in self.series.items()
+            }
+        for labels, value in sorted(series.items()):
+            if self.kind != "histogram":
+                yield f"{self.name}{format_labels(labels)} {format_value(value)}"
+                continue
+            cumulative = 0
+            for le, count in zip(self.buckets + (float("inf"),), value):
+                cumulative += count
+                bucket = labels + (("le", format_value(le)),)
+                yield f"{self.name}_bucket{format_labels(bucket)} {cumulative}"
+            yield f"{self.name}_sum{format_labels(labels)} {format_value(value[-2])}"
+            yield f"{self.name}_count{format_labels(labels)} {value[-1]}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+        self.lock = threading.Lock()
+
+    def metric(self, name: str, kind: str, help: str, **kwargs) -> Metric:
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = Metric(name, kind, help, **kwargs)
+            return metric
+
+    def counter(self, name: str, help: str) -> Metric:
+        return self.metric(name, "counter", help)
+
+    def gauge(self, name: str, help: str) -> Metric:
+        return self.metric(name, "gauge", help)
+
+    def histogram(self, name: str, help: str, buckets=DEFAULT_BUCKETS) -> Metric:
+        return self.metric(name, "histogram", help, buckets=buckets)
+
+    def render(self) -> str:
+        with self.lock:
+            metrics = list(self.metrics.values())
+        return "\n".join(line for m in metrics for line in m.render()) + "\n"
+
+
+REGISTRY = Registry()
+STARTUP_SECONDS = REGISTRY.gauge(
+    "pi_player_startup_seconds", "Seconds from process start to a startup milestone"
+)
+
+
+def process_uptime() -> float:
+    # seconds since the process was started, including interpreter startup
+    # and imports. linux only, falls back to 0
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, IndexError, ValueError):
+        return 0.0
+    return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+
+
+def startup_milestone(phase: str) -> None:
+    seconds = process_uptime()
+    STARTUP_SECONDS.set(seconds, phase=phase)
+    logging.info("startup. %s after %.2fs", phase, seconds)
+
+
+def timed(histogram: Metric, **labels) -> Callable:
+    # decorator, records the duration of every call. coroutine functions are
+    # timed until they return, not until the first await
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrap(*args, **kwargs):
+                with histogram.time(**labels):
+                    return await func(*args, **kwargs)
+
+            return async_wrap
+
+        @functools.wraps(func)
+        def wrap(*args, **kwargs):
+            with histogram.time(**labels):
+                return func(*args, **kwargs)
+
+        return wrap
+
+    return decorator
+
+
+class MetricsConfig(NamedTuple):
+    enabled: bool
+    host: str
+    port: int
+
+
+class MetricsServer:
+    # serves GET /metrics for a Prometheus scraper or `curl`
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self, config: dict, registry: Registry = REGISTRY):
+        self.config = MetricsConfig(
+            enabled=config.get("enabled", True),
+            host=config.get("host", "127.0.0.1"),
+            port=config.get("port", 9101),
+        )
+        self.registry = registry
+
+    async def handle(self, request: "web.Request") -> "web.Response":
+        from aiohttp import web
+
+        return web.Response(
+            body=self.registry.render().encode(),
+            headers={"Content-Type": MetricsServer.CONTENT_TYPE},
+        )
+
+    async def refresh_loop(self) -> None:
+        if not self.config.enabled:
+            return
+        from aiohttp import web
+
+        app = web.Application()
+        app.router.add_get("/metrics", self.handle)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        try:
+            try:
+                await web.TCPSite(runner, self.config.host, self.config.port).start()
+            except OSError as e:
+                # e.g. the port is taken, the player runs on without metrics
+                logging.warning("metrics server failed. %s", e)
+                return
+            logging.info("serving metrics. %s:%d", self.config.host, self.config.port)
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
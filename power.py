@@ -0,0 +1,98 @@
+import asyncio
+import logging
+import time
+
+from enum import StrEnum, auto
+from typing import Awaitable, Callable, List, NamedTuple
+from metrics import REGISTRY
+
+POWER_STATE = REGISTRY.gauge("pi_player_power_state", "1 for the current power state")
+
+
+class PowerState(StrEnum):
+    ACTIVE = auto()
+    # display dimmed, everything else as usual
+    DIMMED = auto()
+    # display off and not written to, LMS polled slowly
+    SLEEPING = auto()
+
+
+class PowerConfig(NamedTuple):
+    # seconds without activity, None never dims or sleeps
+    dim_after: float | None
+    sleep_after: float | None
+
+
+class PowerManager:
+    # activity state machine. remote and encoder input and play state changes
+    # make the box ACTIVE at once, without either it is DIMMED after dim_after
+    # seconds and SLEEPING after sleep_after. playback keeps it from sleeping
+    # but not from dimming
+
+    def __init__(self, config: dict):
+        self.config = PowerConfig(
+            dim_after=config.get("dim_after", 60),
+            sleep_after=config.get("sleep_after", 600),
+        )
+        self.state = PowerState.ACTIVE
+        self.last_activity = time.monotonic()
+        self.is_playing = False
+        self.changed = asyncio.Event()
+        self.listeners: List[Callable[[PowerState], Awaitable[None]]] = []
+        for state in PowerState:
+            POWER_STATE.set(int(state == self.state), state=state)
+
+    def subscribe(self, listener: Callable[[PowerState], Awaitable[None]]) -> None:
+        # called with every new state, in order
+        self.listeners.append(listener)
+
+    def activity(self) -> None:
+        self.last_activity = time.monotonic()
+        if self.state != PowerState.ACTIVE:
+            self.changed.set()
+
+    def playing(self, playing: bool) -> None:
+        # playback started or stopped elsewhere, e.g. from an app, counts as
+        # activity so the new track is seen
+        if playing != self.is_playing:
+            self.is_playing = playing
+            self.activity()
+
+    def target(self, now: float) -> PowerState:
+        idle = now - self.last_activity
+        dim_after, sleep_after = self.config
+        # the thresholds are independent, either may be None
+        if not (self.is_playing or sleep_after is None or idle < sleep_after):
+            return PowerState.SLEEPING
+        if dim_after is None or idle < dim_after:
+            return PowerState.ACTIVE
+        return PowerState.DIMMED
+
+    def next_change(self, now: float) -> float | None:
+        # seconds until target() changes without further activity
+        idle = now - self.last_activity
+        dim_after, sleep_after = self.config
+        pending = [
+            after - idle
+            for after in (dim_after, None if self.is_playing else sleep_after)
+            if after is not None and idle < after
+        ]
+        return min(pending, default=None)
+
+    async def refresh_loop(self) -> None:
+        while True:
+            now = time.monotonic()
+            state = self.target(now)
+            if state != self.state:
+                logging.info("power. %s", state)
+                self.state = state
+                for s in PowerState:
+                    POWER_STATE.set(int(s == state), state=s)
+                for listener in self.listeners:
+                    await listener(state)
+            try:
+                async with asyncio.timeout(self.next_change(now)):
+                    await self.changed.wait()
+            except TimeoutError:
+                pass
+            self.changed.clear()
@@ -1,10 +1,16 @@
+import asyncio
 import evdev
+import fcntl
 import logging
+import struct
+import time
 
 from enum import StrEnum, auto
+from typing import Dict, NamedTuple, Set
 from control import Control, InputMode
 from media_player import MediaPlayerControl, MediaPlayerOp
-from throttle import Debounce, TokenBucket
+from metrics import REGISTRY
+from throttle import Throttle, ThrottleConfig, ThrottleMode
 
 """
 Remote control functionality
@@ -52,13 +58,116 @@ class RemoteButton(StrEnum):
     MEGA_BASS = auto()
 
 
+THROTTLED = REGISTRY.counter(
+    "pi_player_remote_throttled_total", "Remote presses dropped by a throttle"
+)
+QUEUE_SECONDS = REGISTRY.histogram(
+    "pi_player_remote_queue_seconds", "Delay from the ir event to its action"
+)
+
+# repeats of a held key arrive every ~110ms (NEC), a longer gap is a new press
+REPEAT_GAP = 0.25
+# seconds held -> volume step multiplier
+DEFAULT_HOLD_ACCELERATION = ((0, 1), (1.5, 2), (3, 3))
+# _IOW('E', 0xa0, int), selects the clock of a device's event timestamps
+EVIOCSCLOCKID = 0x400445A0
+
+
+class KeyCategory(StrEnum):
+    VOLUME = auto()
+    INPUT = auto()
+    TRANSPORT = auto()
+
+
+# keys that keep acting while held
+REPEAT_BUTTONS = (
+    RemoteButton.VOL_UP,
+    RemoteButton.VOL_DOWN,
+    RemoteButton.TUNE_UP,
+    RemoteButton.TUNE_DOWN,
+)
+VOLUME_BUTTONS = REPEAT_BUTTONS + (RemoteButton.BAND,)
+TRANSPORT_BUTTONS = (
+    RemoteButton.PLAY,
+    RemoteButton.PAUSE,
+    RemoteButton.STOP,
+    RemoteButton.PREV,
+    RemoteButton.HOLD_PREV,
+    RemoteButton.NEXT,
+    RemoteButton.HOLD_NEXT,
+)
+
+
+DEFAULT_THROTTLES = {
+    KeyCategory.VOLUME: ThrottleConfig(ThrottleMode.LATEST, interval=0.175, burst=1),
+    KeyCategory.INPUT: ThrottleConfig(ThrottleMode.LEADING, interval=0.25, burst=1),
+    KeyCategory.TRANSPORT: ThrottleConfig(ThrottleMode.LEADING, interval=0.25, burst=1),
+}
+
+
+def key_category(button: RemoteButton) -> KeyCategory:
+    if button in VOLUME_BUTTONS:
+        return KeyCategory.VOLUME
+    if button in TRANSPORT_BUTTONS:
+        return KeyCategory.TRANSPORT
+    return KeyCategory.INPUT
+
+
+def use_monotonic_timestamps(device: evdev.InputDevice) -> bool:
+    # evdev stamps events with CLOCK_REALTIME by default, which jumps when
+    # NTP syncs on a pi without an rtc. switch the device to CLOCK_MONOTONIC
+    try:
+        clock = struct.pack("i", time.CLOCK_MONOTONIC)
+        fcntl.ioctl(device.fd, EVIOCSCLOCKID, clock)
+    except (AttributeError, OSError) as e:
+        logging.warning("no monotonic event timestamps. %s", e)
+        return False
+    return True
+
+
+class KeyPress(NamedTuple):
+    button: RemoteButton
+    # time.monotonic() of the event
+    timestamp: float
+    # seconds since the key went down, 0 for a fresh press
+    held: float
+
+
 class RemoteControl:
-    def __init__(self, config: dict, ctl: Control, mediactl: MediaPlayerControl):
-        self.button_throttle = Debounce(0.25)
-        self.volume_throttle = TokenBucket(1, 0.175)
-        self.device = evdev.InputDevice(config["input_device"])
+    def __init__(
+        self,
+        config: dict,
+        ctl: Control,
+        mediactl: MediaPlayerControl,
+        device: evdev.InputDevice | None = None,
+    ):
+        self.device = device or evdev.InputDevice(config["input_device"])
+        self.event_clock = use_monotonic_timestamps(self.device)
+        throttle_config = config.get("throttle", {})
+        self.throttles = {
+            category: Throttle(
+                ThrottleConfig.from_dict(
+                    throttle_config.get(str(category), {}), default
+                )
+            )
+            for category, default in DEFAULT_THROTTLES.items()
+        }
+        self.admitting: Set[asyncio.Task] = set()
         self.ctl = ctl
         self.mediactl = mediactl
+        self.hold_acceleration = tuple(
+            sorted(
+                (float(t), float(m))
+                for t, m in config.get("hold_acceleration", DEFAULT_HOLD_ACCELERATION)
+            )
+        )
+        self.last_press: KeyPress | None = None
+        self.hold_start = 0.0
+        # actions run on one serialized worker per category, so a slow input
+        # switch never delays volume or transport keys
+        self.queues: Dict[KeyCategory, asyncio.Queue[KeyPress]] = {
+            category: asyncio.Queue() for category in KeyCategory
+        }
 
         self.keymap = dict()
         for k, v in config["keymap"].items():
@@ -68,33 +177,81 @@ class RemoteControl:
 
     async def refresh_loop(self):
         logging.info("started remote event listener...")
-        async for event in self.device.async_read_loop():
-            code = event.value
-            if code == 0:
-                continue
-
-            button = self.keymap.get(code)
-            if not button:
-                logging.debug(f"unrecognized remote code: {code}")
-                continue
-
-            await self.handle_keypress(button)
-
-    def has_tokens(self, button: int) -> bool:
-        if button in (
-            RemoteButton.VOL_UP,
-            RemoteButton.VOL_DOWN,
-            RemoteButton.TUNE_UP,
-            RemoteButton.TUNE_DOWN,
+        workers = [
+            asyncio.create_task(self.worker(category)) for category in KeyCategory
+        ]
+        try:
+            async for event in self.device.async_read_loop():
+                code = event.value
+                if code == 0:
+                    continue
+
+                button = self.keymap.get(code)
+                if not button:
+                    logging.debug(f"unrecognized remote code: {code}")
+                    continue
+
+                timestamp = event.timestamp() if self.event_clock else time.monotonic()
+                self.dispatch(self.track_hold(button, timestamp))
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+    def track_hold(self, button: RemoteButton, timestamp: float) -> KeyPress:
+        last = self.last_press
+        if (
+            last is None
+            or last.button != button
+            or not 0 <= timestamp - last.timestamp <= REPEAT_GAP
         ):
-            return self.volume_throttle.has_tokens()
-        else:
-            return self.button_throttle.has_tokens()
+            self.hold_start = timestamp
+        self.last_press = KeyPress(button, timestamp, timestamp - self.hold_start)
+        return self.last_press
 
-    async def handle_keypress(self, button: int, force: bool = False) -> None:
-        if not force and not self.has_tokens(button):
+    def press(self, button: RemoteButton) -> None:
+        # for keys from other sources, e.g. the encoder switch
+        self.dispatch(KeyPress(button, time.monotonic(), 0.0))
+
+    def dispatch(self, press: KeyPress) -> None:
+        self.ctl.power.activity()
+        if press.held and press.button not in REPEAT_BUTTONS:
+            THROTTLED.inc(throttle="repeat")
             return
+        # throttles may hold an event back, the read loop must not wait for it
+        task = asyncio.create_task(self.admit(press))
+        self.admitting.add(task)
+        task.add_done_callback(self.admitting.discard)
+
+    async def admit(self, press: KeyPress) -> bool:
+        category = key_category(press.button)
+        if not await self.throttles[category].acquire(press.timestamp):
+            THROTTLED.inc(throttle=category)
+            return False
+        self.queues[category].put_nowait(press)
+        return True
+
+    async def worker(self, category: KeyCategory) -> None:
+        queue = self.queues[category]
+        while True:
+            press = await queue.get()
+            delay = max(0.0, time.monotonic() - press.timestamp)
+            QUEUE_SECONDS.observe(delay, button=press.button)
+            logging.debug("%s queued %.1fms", press.button, delay * 1000)
+            try:
+                await self.handle_keypress(press.button, held=press.held)
+            except Exception:
+                logging.exception("handle_keypress failed. %s", press.button)
+
+    def hold_multiplier(self, held: float) -> float:
+        multiplier = 1.0
+        for threshold, m in self.hold_acceleration:
+            if held >= threshold:
+                multiplier = m
+        return multiplier
+
+    async def handle_keypress(self, button: int, held: float = 0.0) -> None:
         logging.info("handle_keypress. %s", button)
+        step = self.hold_multiplier(held)
         match button:
             case RemoteButton.FUNCTION:
                 print("FUNCTION")
@@ -121,21 +278,21 @@ class RemoteControl:
             case RemoteButton.NINE:
                 print("NINE")
             case RemoteButton.MODE:
-                print("MODE")
+                await self.ctl.toggle_track_info()
             case RemoteButton.ZERO_TEN:
-                print("0/10")
+                await self.ctl.show_gallery()
             case RemoteButton.GT_TEN:
                 await self.ctl.next_input()
             case RemoteButton.BAND:
                 await self.ctl.volume_dim()
             case RemoteButton.TUNE_UP:
-                await self.ctl.volume_step(0.5)
+                await self.ctl.volume_step(0.5 * step)
             case RemoteButton.TUNE_DOWN:
-                await self.ctl.volume_step(-0.5)
+                await self.ctl.volume_step(-0.5 * step)
             case RemoteButton.VOL_UP:
-                await self.ctl.volume_step(3.0)
+                await self.ctl.volume_step(3.0 * step)
             case RemoteButton.VOL_DOWN:
-                await self.ctl.volume_step(-3.0)
+                await self.ctl.volume_step(-3.0 * step)
             case RemoteButton.PLAY:
                 await self.mediactl.op(MediaPlayerOp.PLAY)
             case RemoteButton.PAUSE:
@@ -0,0 +1,472 @@
+import asyncio
+import io
+import json
+import logging
+import sys
+import tempfile
+import threading
+import time
+
+from collections import deque
+from pathlib import Path
+from typing import Callable, Deque, Dict, List, NamedTuple
+from urllib.parse import quote
+import numpy as np
+import yaml
+from aiohttp import web
+from PIL import Image
+from luma.core.device import dummy
+from display import unpack_rgb565
+from encoder import GPIO_A, GPIO_B, GPIO_SW
+from remote import RemoteButton
+
+"""
+Hardware-free stand-ins for every I/O edge of pi_player, so the full asyncio
+pipeline can run and be profiled on any Linux machine:
+- SimulatedDevice: in-memory st7789 that records transfers and SPI timing
+- SimulatedInputDevice: synthetic evdev event source
+- SimulatedPi: pigpio replacement that generates quadrature edges
+- FakeCamillaDSP: camilladsp websocket server
+- FakeLMS: LMS JSON-RPC, cover art and CLI notification server
+"""
+
+
+class Transfer(NamedTuple):
+    timestamp: float
+    box: tuple
+    nbytes: int
+
+
+class SimulatedDevice(dummy):
+    # speaks the st7789 subset used by DisplayControl (address window + 16bit
+    # RGB565 data) and sleeps for the time the transfer would take on the SPI
+    # bus. the framebuffer holds the decoded 24bit colours
+
+    def __init__(self, width=240, height=240, bus_speed_hz=52000000, **kwargs):
+        super().__init__(width=width, height=height, mode="RGB", **kwargs)
+        self.bus_speed_hz = bus_speed_hz
+        self.framebuffer = np.zeros((height, width, 3), dtype=np.uint8)
+        self.transfers: Deque[Transfer] = deque(maxlen=1000)
+        self.window = (0, 0, width, height)
+        self.frames = 0
+        self.bytes_sent = 0
+        self.brightness = 255
+        self.visible = True
+
+    def contrast(self, level):
+        self.brightness = level
+
+    def hide(self):
+        self.visible = False
+
+    def show(self):
+        self.visible = True
+
+    def set_window(self, x1, y1, x2, y2):
+        self.window = (x1, y1, x2, y2)
+
+    def data(self, data):
+        x1, y1, x2, y2 = self.window
+        packed = np.frombuffer(bytes(data), dtype=">u2").reshape(y2 - y1, x2 - x1)
+        self.write(self.window, unpack_rgb565(packed), len(data))
+
+    def display(self, image):
+        super().display(image)
+        pixels = np.asarray(self.image.convert("RGB"))
+        self.write((0, 0, self.width, self.height), pixels, pixels.size)
+
+    def write(self, box, pixels: np.ndarray, nbytes: int):
+        if self.bus_speed_hz:
+            time.sleep(nbytes * 8 / self.bus_speed_hz)
+        x1, y1, x2, y2 = box
+        self.framebuffer[y1:y2, x1:x2] = pixels
+        self.frames += 1
+        self.bytes_sent += nbytes
+        self.transfers.append(Transfer(time.monotonic(), box, nbytes))
+
+    def snapshot(self) -> Image.Image:
+        return Image.fromarray(self.framebuffer.copy())
+
+
+class SimulatedEvent(NamedTuple):
+    sec: int
+    usec: int
+    type: int
+    code: int
+    value: int
+
+    def timestamp(self) -> float:
+        return self.sec + self.usec / 1000000
+
+
+class SimulatedInputDevice:
+    # the subset of evdev.InputDevice used by RemoteControl. ir receivers
+    # report scancodes as EV_MSC/MSC_SCAN events with the code as value
+    EV_MSC = 4
+    MSC_SCAN = 4
+
+    def __init__(self, name: str = "simulated-ir"):
+        self.name = name
+        self.events: asyncio.Queue[SimulatedEvent] = asyncio.Queue()
+
+    def __str__(self) -> str:
+        return f"device simulated, name {self.name!r}"
+
+    def press(self, code: int, timestamp: float | None = None) -> None:
+        timestamp = time.time() if timestamp is None else timestamp
+        sec, usec = int(timestamp), int((timestamp % 1) * 1000000)
+        self.events.put_nowait(
+            SimulatedEvent(sec, usec, self.EV_MSC, self.MSC_SCAN, code)
+        )
+
+    async def async_read_loop(self):
+        while True:
+            yield await self.events.get()
+
+
+class SimulatedPi:
+    # the subset of pigpio.pi used by RotaryEncoder. callbacks are invoked on
+    # the calling thread, call turn/press from a worker thread to mimic pigpio
+
+    def __init__(self, edge_interval_us: int = 2000):
+        self.edge_interval_us = edge_interval_us
+        self.callbacks: Dict[int, List[Callable]] = {}
+        self.tick = 0
+        self.levels = {GPIO_A: 1, GPIO_B: 1, GPIO_SW: 1}
+        self.lock = threading.Lock()
+
+    def set_glitch_filter(self, gpio, steady):
+        pass
+
+    def set_pull_up_down(self, gpio, pud):
+        pass
+
+    def callback(self, gpio, edge=0, func=None):
+        self.callbacks.setdefault(gpio, []).append(func)
+
+    def stop(self):
+        pass
+
+    def edge(self, gpio: int, level: int) -> None:
+        # microseconds like pigpio's tick, edges of a single turn() call are
+        # spaced edge_interval_us apart
+        now = int(time.monotonic() * 1000000)
+        self.tick = max(now, self.tick + self.edge_interval_us)
+        self.levels[gpio] = level
+        for cb in self.callbacks.get(gpio, []):
+            cb(gpio, level, self.tick & 0xFFFFFFFF)
+
+    def turn(self, steps: int) -> None:
+        # the encoder has a detent every half quadrature cycle, i.e. every
+        # second edge. the rest position alternates between both lines low
+        # and both lines high, the leading line sets the direction
+        first, second = (GPIO_A, GPIO_B) if steps > 0 else (GPIO_B, GPIO_A)
+        with self.lock:
+            for _ in range(abs(steps)):
+                level = 0 if self.levels[GPIO_A] else 1
+                self.edge(first, level)
+                self.edge(second, level)
+
+    def press(self) -> None:
+        with self.lock:
+            self.edge(GPIO_SW, 0)
+            self.edge(GPIO_SW, 1)
+
+
+class FakeCamillaDSP:
+    # camilladsp websocket protocol: a command is a json string, or a single
+    # key object holding its argument. replies are {cmd: {result, value}}
+
+    def __init__(self, config_path: str, volume: float = -40.0):
+        self.state = {"ConfigFilePath": config_path, "Volume": volume}
+        self.commands: Deque[str] = deque(maxlen=1000)
+        self.clients: set[web.WebSocketResponse] = set()
+        self.runner: web.AppRunner | None = None
+
+    async def start(self, host: str, port: int) -> None:
+        app = web.Application()
+        app.router.add_get("/", self.handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, host, port).start()
+        logging.info("fake camilladsp on %s:%d", host, port)
+
+    async def stop(self) -> None:
+        # drops the clients like a killed camilladsp, rather than waiting
+        # for them to disconnect
+        for ws in list(self.clients):
+            await ws.close()
+        if self.runner:
+            await self.runner.cleanup()
+
+    async def handle(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.clients.add(ws)
+        try:
+            async for msg in ws:
+                if msg.type != web.WSMsgType.TEXT:
+                    continue
+                await ws.send_str(json.dumps(self.execute(json.loads(msg.data))))
+        finally:
+            self.clients.discard(ws)
+        return ws
+
+    def execute(self, message) -> dict:
+        if isinstance(message, str):
+            command, arg = message, None
+        else:
+            command, arg = next(iter(message.items()))
+        self.commands.append(command)
+
+        value = None
+        match command:
+            case "GetVersion":
+                value = "2.0.3"
+            case "GetState":
+                value = "Running"
+            case "ValidateConfig":
+                # like camilladsp, a config that doesn't parse is rejected
+                if not isinstance(yaml.safe_load(arg), dict):
+                    return {command: {"result": "Error", "value": "invalid config"}}
+                value = arg
+            case "SetConfigJson":
+                self.state["Config"] = arg
+            case _ if command.startswith("Set"):
+                self.state[command.removeprefix("Set")] = arg
+            case _ if command.startswith("Get"):
+                value = self.state.get(command.removeprefix("Get"))
+        return {command: {"result": "Ok", "value": value}}
+
+
+class FakeTrack(NamedTuple):
+    title: str
+    artist: str
+    album: str
+    duration: float
+
+
+class FakeLMS:
+    # enough of the LMS JSON-RPC api for pysqueezebox, generated cover art
+    # and the CLI subscribe/notification stream used by LMSEventListener
+
+    def __init__(self, player_name: str, tracks: List[FakeTrack] | None = None):
+        self.player_name = player_name
+        self.player_id = "00:00:00:00:00:01"
+        self.tracks = tracks or [
+            FakeTrack(f"Track {i + 1}", "Simulated Artist", f"Album {i // 4 + 1}", 180)
+            for i in range(12)
+        ]
+        self.index = 0
+        self.mode = "play"
+        self.position = 0.0
+        self.started = time.monotonic()
+        self.playlist_timestamp = time.time()
+        self.subscribers: List[asyncio.StreamWriter] = []
+        self.requests = 0
+        self.cover_requests = 0
+        self.runner: web.AppRunner | None = None
+        self.cli: asyncio.Server | None = None
+
+    async def start(self, host: str, port: int, cli_port: int) -> None:
+        app = web.Application()
+        app.router.add_post("/jsonrpc.js", self.handle_jsonrpc)
+        app.router.add_get("/music/{coverid}/cover.jpg", self.handle_cover)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, host, port).start()
+        self.cli = await asyncio.start_server(self.handle_cli, host, cli_port)
+        logging.info("fake lms on %s:%d, cli %d", host, port, cli_port)
+
+    async def stop(self) -> None:
+        if self.cli:
+            self.cli.close()
+        for writer in self.subscribers:
+            writer.close()
+        if self.runner:
+            await self.runner.cleanup()
+
+    def elapsed(self) -> float:
+        if self.mode != "play":
+            return self.position
+        return self.position + time.monotonic() - self.started
+
+    def track(self, i: int) -> dict:
+        t = self.tracks[i]
+        return {
+            "playlist index": i,
+            "id": i + 1,
+            "title": t.title,
+            "artist": t.artist,
+            "album": t.album,
+            "duration": t.duration,
+            "coverid": str(i + 1),
+            "samplerate": "44100",
+            "bitrate": "1411kb/s CBR",
+        }
+
+    def status(self) -> dict:
+        return {
+            "player_name": self.player_name,
+            "mode": self.mode,
+            "time": self.elapsed(),
+            "playlist_cur_index": str(self.index),
+            "playlist_tracks": len(self.tracks),
+            "playlist_timestamp": self.playlist_timestamp,
+            "playlist_loop": [self.track(i) for i in range(len(self.tracks))],
+        }
+
+    def set_mode(self, mode: str) -> None:
+        self.position = self.elapsed()
+        self.started = time.monotonic()
+        self.mode = mode
+        self.notify(mode if mode != "pause" else "pause 1")
+
+    def command(self, args: List[str]) -> dict:
+        match args:
+            case ["players", *_]:
+                return {
+                    "count": 1,
+                    "players_loop": [
+                        {
+                            "playerid": self.player_id,
+                            "name": self.player_name,
+                            "model": "squeezelite",
+                        }
+                    ],
+                }
+            case ["status", *_]:
+                return self.status()
+            case ["alarms", *_]:
+                return {"count": 0}
+            case ["playerpref", *_]:
+                return {"_p2": "0"}
+            case ["playlist", "index", index]:
+                if index[0] in "+-":
+                    self.index += int(index)
+                else:
+                    self.index = int(index)
+                self.index = max(0, min(len(self.tracks) - 1, self.index))
+                self.position, self.started = 0.0, time.monotonic()
+                self.notify(f"playlist newsong {quote(self.tracks[self.index].title)}")
+            case ["play"]:
+                self.set_mode("play")
+            case ["stop"]:
+                self.set_mode("stop")
+            case ["pause", *_]:
+                self.set_mode("play" if self.mode == "pause" else "pause")
+        return {}
+
+    async def handle_jsonrpc(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        body = json.loads(await request.text())
+        _, args = body["params"]
+        result = self.command([str(a) for a in args])
+        return web.json_response({"id": body["id"], "result": result})
+
+    async def handle_cover(self, request: web.Request) -> web.Response:
+        self.cover_requests += 1
+        coverid = request.match_info["coverid"]
+        i = int(coverid) if coverid.isdigit() else 0
+        image = Image.new("RGB", (500, 500), ((i * 67) % 256, (i * 131) % 256, 160))
+        buf = io.BytesIO()
+        image.save(buf, format="JPEG")
+        return web.Response(body=buf.getvalue(), content_type="image/jpeg")
+
+    async def handle_cli(self, reader, writer) -> None:
+        try:
+            line = await reader.readline()
+            writer.write(line)
+            await writer.drain()
+            self.subscribers.append(writer)
+            await reader.read()
+        finally:
+            if writer in self.subscribers:
+                self.subscribers.remove(writer)
+            writer.close()
+
+    def notify(self, event: str, player_id: str | None = None) -> None:
+        # player_id defaults to the simulated player's, LMS sends notifications
+        # about every player to every subscriber
+        line = f"{quote(player_id or self.player_id)} {event}\n".encode()
+        for writer in self.subscribers:
+            writer.write(line)
+
+
+class Simulator:
+    # starts the fake servers and rewrites the config to point at them
+
+    def __init__(self, config: dict):
+        self.sim_config = config.get("simulator", {})
+        self.host = "127.0.0.1"
+        self.configs_dir = tempfile.TemporaryDirectory(prefix="pi_player_sim_")
+        filenames = {f for configs in config["inputs"].values() for f in configs}
+        for filename in filenames:
+            Path(self.configs_dir.name, filename).write_text(f"title: {filename}\n")
+
+        first_config = next(iter(config["inputs"].values()))[0]
+        self.cdsp = FakeCamillaDSP(f"{self.configs_dir.name}/{first_config}")
+        self.lms = FakeLMS(config["squeezebox"]["client_name"])
+        self.input_device = SimulatedInputDevice()
+        self.pi = SimulatedPi()
+        self.keymap = {
+            RemoteButton(v.lower()): int(k)
+            for k, v in config["remote"]["keymap"].items()
+        }
+
+    def apply(self, config: dict) -> dict:
+        config = dict(config)
+        config["camilladsp_configs_path"] = f"{self.configs_dir.name}/"
+        config["camilladsp_host"] = self.host
+        config["camilladsp_port"] = self.sim_config.get("camilladsp_port", 11234)
+        config["squeezebox"] = dict(
+            config["squeezebox"],
+            lms_server_ip=self.host,
+            lms_server_port=self.sim_config.get("lms_port", 19000),
+            cli_port=self.sim_config.get("lms_cli_port", 19090),
+        )
+        config["display"] = dict(config.get("display", {}), type="SIMULATED")
+        return config
+
+    async def start(self, config: dict) -> None:
+        await self.cdsp.start(self.host, config["camilladsp_port"])
+        sb = config["squeezebox"]
+        await self.lms.start(self.host, sb["lms_server_port"], sb["cli_port"])
+
+    async def stop(self) -> None:
+        await self.lms.stop()
+        await self.cdsp.stop()
+        self.configs_dir.cleanup()
+
+    def press(self, button: RemoteButton) -> None:
+        self.input_device.press(self.keymap[button])
+
+    async def hold(self, button: RemoteButton, seconds: float) -> None:
+        # a held NEC key repeats its scancode every 108ms
+        deadline = time.monotonic() + seconds
+        while True:
+            self.press(button)
+            if time.monotonic() + 0.108 > deadline:
+                return
+            await asyncio.sleep(0.108)
+
+    async def stdin_loop(self) -> None:
+        # interactive driver: a RemoteButton name per line, optionally followed
+        # by seconds to hold it, +N/-N to turn the encoder by N detents and
+        # "sw" to press its switch
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader()
+        await loop.connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(reader), sys.stdin
+        )
+        while line := (await reader.readline()).decode().strip():
+            try:
+                if line == "sw":
+                    await asyncio.to_thread(self.pi.press)
+                elif line[0] in "+-":
+                    await asyncio.to_thread(self.pi.turn, int(line))
+                else:
+                    name, _, seconds = line.partition(" ")
+                    await self.hold(RemoteButton(name.lower()), float(seconds or 0))
+            except (ValueError, KeyError):
+                logging.warning("simulator. unknown input %r", line)
@@ -1,3 +1,6 @@
+from time import monotonic
+
+
 class SongState:
     def __init__(
         self,
@@ -9,6 +12,7 @@ class SongState:
         bitrate: int = 0,
         samplerate: str = None,
         image_url: str = None,
+        mode: str = None,
     ):
         self.album = album
         self.artist = artist
@@ -18,6 +22,21 @@ class SongState:
         self.bitrate = bitrate
         self.samplerate = samplerate
         self.image_url = image_url
+        self.mode = mode
+        self.synced_at = monotonic()
+
+    def resync(self, other: "SongState") -> None:
+        self.time = other.time
+        self.length = other.length
+        self.mode = other.mode
+        self.synced_at = other.synced_at
+
+    def elapsed(self) -> float:
+        # interpolated locally between LMS updates while playing
+        if self.mode != "play":
+            return self.time
+        elapsed = self.time + monotonic() - self.synced_at
+        return min(elapsed, self.length) if self.length else elapsed
 
     def __eq__(self, other) -> bool:
         return (
@@ -1,109 +1,272 @@
-import aiohttp
 import asyncio
 import logging
+import time
 
-from typing import NamedTuple
-from pysqueezebox import Server, Player
+from collections import deque
+from typing import TYPE_CHECKING, Deque, List, NamedTuple
 from control import Control
+from lms_events import LMSEventListener
 from media_player import MediaPlayerOp
+from metrics import REGISTRY
+from power import PowerState
 from song_state import SongState
 
+if TYPE_CHECKING:
+    import aiohttp
+    from pysqueezebox import Player, Server
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    "pi_player_lms_request_seconds", "LMS http request round trip"
+)
+
 
 class SqueezeboxConfig(NamedTuple):
     lms_server_ip: str
+    lms_server_port: int
     polling_sleep: float
     client_name: str
+    events: bool
+    cli_port: int
+    heartbeat_sleep: float
+    idle_polling_sleep: float
+    prefetch_tracks: int
+
+
+class MediaCommand(NamedTuple):
+    op: MediaPlayerOp
+    count: int = 1
+
+
+def coalesce_ops(ops: List[MediaPlayerOp]) -> List[MediaCommand]:
+    # PREV/NEXT runs fold into a single relative index jump, repeated PLAY or
+    # STOP collapse and consecutive PAUSE toggles cancel out in pairs
+    commands: List[MediaCommand] = []
+    for op in ops:
+        count = 1
+        if op == MediaPlayerOp.PREV:
+            op, count = MediaPlayerOp.NEXT, -1
+        last = commands[-1] if commands else None
+        if last and last.op == op:
+            match op:
+                case MediaPlayerOp.NEXT:
+                    commands[-1] = MediaCommand(op, last.count + count)
+                    continue
+                case MediaPlayerOp.PLAY | MediaPlayerOp.STOP:
+                    continue
+                case MediaPlayerOp.PAUSE:
+                    commands.pop()
+                    continue
+        commands.append(MediaCommand(op, count))
+    return commands
+
+
+def lms_trace_config() -> "aiohttp.TraceConfig":
+    # times every request made on the LMS session until the response headers
+    # arrive. JSON-RPC queries and album art downloads are labelled apart
+    import aiohttp
+
+    trace = aiohttp.TraceConfig()
+
+    async def on_request_start(session, ctx, params):
+        ctx.start = time.perf_counter()
+
+    async def on_request_end(session, ctx, params):
+        endpoint = "jsonrpc" if params.url.path.endswith("jsonrpc.js") else "artwork"
+        REQUEST_SECONDS.observe(time.perf_counter() - ctx.start, endpoint=endpoint)
+
+    trace.on_request_start.append(on_request_start)
+    trace.on_request_end.append(on_request_end)
+    return trace
 
 
 class SqueezeboxControl:
     def __init__(self, config: dict, ctl: Control) -> None:
         self.ctl = ctl
-        self.pending: MediaPlayerOp | None = None
-        self.cond = asyncio.Condition()
+        self.ops: Deque[MediaPlayerOp] = deque()
+        self.ops_ready = asyncio.Event()
         self.curr_song_state = SongState()
         self.config = SqueezeboxConfig(
             lms_server_ip=config["lms_server_ip"],
+            lms_server_port=config.get("lms_server_port", 9000),
             polling_sleep=config["polling_sleep"],
             client_name=config["client_name"],
+            events=config.get("events", True),
+            cli_port=config.get("cli_port", 9090),
+            heartbeat_sleep=config.get("heartbeat_sleep", 30),
+            idle_polling_sleep=config.get("idle_polling_sleep", 30),
+            prefetch_tracks=config.get("prefetch_tracks", 2),
         )
+        self.session: "aiohttp.ClientSession | None" = None
+        self.lms: "Server | None" = None
+        self.player: "Player | None" = None
+        self.connecting: asyncio.Task | None = None
+        self.updated = asyncio.Event()
+        self.events = LMSEventListener(
+            self.config.lms_server_ip,
+            self.config.cli_port,
+            on_event=lambda _: self.updated.set(),
+        )
+        self.ctl.power.subscribe(self.power_changed)
 
     async def op(self, op: MediaPlayerOp) -> None:
-        async with self.cond:
-            if self.pending:
-                logging.debug("op '%s' initiated while pending is not None", op)
-                return
+        self.ops.append(op)
+        self.ops_ready.set()
+        match op:
+            case MediaPlayerOp.NEXT:
+                self.prefetch_art(range(1, self.config.prefetch_tracks + 1))
+            case MediaPlayerOp.PREV:
+                self.prefetch_art([-1])
 
-            self.pending = op
-            self.cond.notify()
+    def track_image_url(self, index: int) -> str | None:
+        # same resolution as Player.image_url, for any track in the playlist
+        playlist = self.player.playlist if self.player else None
+        if not playlist or not 0 <= index < len(playlist):
+            return None
+        track = playlist[index]
+        if "artwork_url" in track:
+            artwork_url = track["artwork_url"]
+            if not artwork_url.startswith("http"):
+                artwork_url = self.lms.generate_image_url(artwork_url)
+            return artwork_url
+        if "coverid" in track:
+            return self.lms.generate_image_url_from_track_id(track["coverid"])
+        return None
 
-    async def handle_op(self, player: Player) -> None:
-        try:
-            async with self.cond:
-                async with asyncio.timeout(self.config.polling_sleep):
-                    await self.cond.wait()
-
-                match self.pending:
-                    case MediaPlayerOp.PREV:
-                        if player.current_index == 0:
-                            logging.info("PREV noop")
-                            return
-                        await player.async_index("-1")
-                    case MediaPlayerOp.NEXT:
-                        if player.current_index + 1 == player.playlist_tracks:
-                            logging.info("NEXT noop")
-                            return
-                        await player.async_index("+1")
-                    case MediaPlayerOp.PLAY:
-                        await player.async_play()
-                    case MediaPlayerOp.STOP:
-                        await player.async_stop()
-                    case MediaPlayerOp.PAUSE:
-                        await player.async_toggle_pause()
-                    case _:
-                        logging.error(f"{self.pending} not assigned")
-                logging.info("handle_op. %s", self.pending)
-        except TimeoutError:
-            # in most cases the remote is not pressed so this will time-out
+    def prefetch_art(self, offsets) -> None:
+        if self.player is None or self.player.current_index is None:
             return
-        finally:
-            self.pending = None
+        urls = [self.track_image_url(self.player.current_index + i) for i in offsets]
+        self.ctl.display_manager.art_cache.prefetch(urls)
 
-    async def player_update(self, player: Player) -> None:
+    async def handle_command(self, player: "Player", command: MediaCommand) -> None:
+        match command.op:
+            case MediaPlayerOp.NEXT:
+                if command.count == 0 or player.current_index is None:
+                    return
+                last = max(0, (player.playlist_tracks or 1) - 1)
+                index = max(0, min(last, player.current_index + command.count))
+                if index == player.current_index:
+                    logging.info("index noop. %+d", command.count)
+                    return
+                await player.async_index(f"{index - player.current_index:+d}")
+            case MediaPlayerOp.PLAY:
+                await player.async_play()
+            case MediaPlayerOp.STOP:
+                await player.async_stop()
+            case MediaPlayerOp.PAUSE:
+                await player.async_toggle_pause()
+            case _:
+                logging.error(f"{command.op} not assigned")
+        logging.info("handle_command. %s", command)
+
+    async def power_changed(self, state: PowerState) -> None:
+        # status is fetched right away on wake, the poll interval may be stale
+        if state == PowerState.ACTIVE:
+            self.updated.set()
+
+    def poll_interval(self) -> float:
+        # polling backs off while nothing plays and nobody is using the box
+        if self.events.connected:
+            return self.config.heartbeat_sleep
+        if self.ctl.power.is_playing or self.ctl.power.state == PowerState.ACTIVE:
+            return self.config.polling_sleep
+        return self.config.idle_polling_sleep
+
+    async def player_update(self, player: "Player") -> None:
         await player.async_update()
+        self.ctl.power.playing(player.mode == "play")
         song_state = SongState(
             album=player.album,
             artist=player.artist,
             title=player.title,
-            time=player.time,
-            duration=player.duration,
+            time=player.time or 0,
+            duration=player.duration or 0,
             bitrate=player.bitrate,
             samplerate=player.samplerate,
             image_url=player.image_url,
+            mode=player.mode,
         )
         if self.curr_song_state != song_state:
             self.curr_song_state = song_state
             await self.ctl.update_song_state(song_state)
+            self.prefetch_art(range(1, self.config.prefetch_tracks + 1))
+        else:
+            self.curr_song_state.resync(song_state)
 
         logging.debug(
             f"{player.artist} - [{player.album}] {player.title} / {player.image_url}"
         )
 
-    async def refresh_loop(self):
+    def start(self) -> None:
+        # player discovery doesn't depend on camilladsp or the display and is
+        # started before them
+        if self.connecting is None:
+            self.connecting = asyncio.create_task(self.connect())
+
+    async def connect(self) -> None:
+        import aiohttp
+        from pysqueezebox import Server
+
+        self.session = aiohttp.ClientSession(trace_configs=[lms_trace_config()])
+        self.lms = Server(
+            self.session, self.config.lms_server_ip, self.config.lms_server_port
+        )
         player = None
-        async with aiohttp.ClientSession() as session:
-            lms = Server(session, self.config.lms_server_ip)
-            while player is None:
-                player = await lms.async_get_player(name=self.config.client_name)
-                if not player:
-                    logging.warning("squeezebox player not found. retrying...")
-                    await asyncio.sleep(1)
-                    
+        while player is None:
+            player = await self.lms.async_get_player(name=self.config.client_name)
+            if not player:
+                logging.warning("squeezebox player not found. retrying...")
+                await asyncio.sleep(1)
+        self.player = player
+        logging.info("squeezebox player found. %s", player.name)
+
+    async def refresh_loop(self):
+        self.start()
+        try:
+            await self.connecting
+            player = self.player
+            self.ctl.display_manager.art_cache.set_session(self.session)
+
             logging.info("started squeezebox listener...")
-            while True:
-                for coro in asyncio.as_completed(
-                    [
-                        self.handle_op(player),
-                        self.player_update(player),
-                    ]
-                ):
-                    await coro
+            loops = [self.update_loop(player), self.op_loop(player)]
+            if self.config.events:
+                loops.append(self.events.listen(player.player_id))
+            await asyncio.gather(*loops)
+        finally:
+            await self.close()
+
+    async def close(self) -> None:
+        # also called when startup fails before refresh_loop runs
+        if self.connecting:
+            self.connecting.cancel()
+            try:
+                await self.connecting
+            except (asyncio.CancelledError, Exception):
+                pass
+        if self.session:
+            await self.session.close()
+            self.session = None
+
+    async def update_loop(self, player: "Player") -> None:
+        # with LMS events subscribed, status is only fetched when a notification
+        # arrives and a slow heartbeat poll is kept as a fallback
+        while True:
+            await self.player_update(player)
+            try:
+                async with asyncio.timeout(self.poll_interval()):
+                    await self.updated.wait()
+            except TimeoutError:
+                pass
+            self.updated.clear()
+
+    async def op_loop(self, player: "Player") -> None:
+        # ops pressed while a command is in flight queue up and are coalesced
+        # into the next batch. every batch triggers an immediate status update
+        while True:
+            await self.ops_ready.wait()
+            self.ops_ready.clear()
+            ops = list(self.ops)
+            self.ops.clear()
+            for command in coalesce_ops(ops):
+                await self.handle_command(player, command)
+            self.updated.set()
@@ -0,0 +1,97 @@
+import asyncio
+import socket
+
+from art_cache import AlbumArtCache
+from simulator import FakeLMS
+
+HOST = "127.0.0.1"
+SIZE = (32, 32)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind((HOST, 0))
+        return s.getsockname()[1]
+
+
+async def wait_for(condition, timeout: float = 2.0) -> None:
+    async with asyncio.timeout(timeout):
+        while not condition():
+            await asyncio.sleep(0.01)
+
+
+def with_lms(test) -> None:
+    async def run():
+        lms = FakeLMS("pi_player")
+        port = free_port()
+        await lms.start(HOST, port, free_port())
+        try:
+            await test(lms, lambda i: f"http://{HOST}:{port}/music/{i}/cover.jpg")
+        finally:
+            await lms.stop()
+
+    asyncio.run(run())
+
+
+def test_prefetch_warms_cache_one_download_each():
+    async def test(lms, url):
+        cache = AlbumArtCache({}, SIZE, "")
+        cache.prefetch([url(1), None, url(2)])
+        await cache.prefetch_task
+        assert url(1) in cache.frames and url(2) in cache.frames
+        assert lms.cover_requests == 2
+
+        # already cached urls are skipped
+        cache.prefetch([url(1), url(2)])
+        await cache.prefetch_task
+        assert lms.cover_requests == 2
+        assert cache.get(url(1)).shape == (SIZE[1], SIZE[0])
+
+    with_lms(test)
+
+
+def test_fetch_shares_prefetch_download():
+    async def test(lms, url):
+        cache = AlbumArtCache({}, SIZE, "")
+        cache.prefetch([url(1)])
+        await asyncio.sleep(0)
+        assert url(1) in cache.pending
+        frame = await cache.fetch(url(1))
+        assert frame is cache.get(url(1))
+        assert lms.cover_requests == 1
+
+    with_lms(test)
+
+
+def test_newer_prefetch_replaces_older_one():
+    async def test(lms, url):
+        cache = AlbumArtCache({}, SIZE, "")
+        cache.prefetch([url(1), url(2)])
+        await asyncio.sleep(0)
+        cache.prefetch([url(3)])
+        await cache.prefetch_task
+        # the download already started still completes, the rest is dropped
+        await wait_for(lambda: url(1) in cache.frames)
+        assert url(2) not in cache.frames
+        assert url(3) in cache.frames
+        assert lms.cover_requests == 2
+
+    with_lms(test)
+
+
+def test_disk_cache_survives_restart(tmp_path):
+    async def test(lms, url):
+        config = {"cache_path": str(tmp_path)}
+        first = AlbumArtCache(config, SIZE, "")
+        first.prefetch([url(1)])
+        await first.prefetch_task
+        assert lms.cover_requests == 1
+
+        cache = AlbumArtCache(config, SIZE, "")
+        assert url(1) not in cache.frames
+        cache.prefetch([url(1)])
+        await cache.prefetch_task
+        assert lms.cover_requests == 1
+        assert (cache.get(url(1)) == first.get(url(1))).all()
+
+    with_lms(test)
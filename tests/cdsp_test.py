@@ -0,0 +1,120 @@
+import asyncio
+import pytest
+import socket
+import time
+
+import cdsp
+from cdsp import COMMAND_ERRORS, CamillaConnection, CommandError
+from simulator import FakeCamillaDSP
+
+HOST = "127.0.0.1"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind((HOST, 0))
+        return s.getsockname()[1]
+
+
+async def wait_for(condition, timeout: float = 2.0) -> None:
+    async with asyncio.timeout(timeout):
+        while not condition():
+            await asyncio.sleep(0.01)
+
+
+@pytest.fixture(autouse=True)
+def short_backoff(monkeypatch):
+    monkeypatch.setattr(cdsp, "MIN_BACKOFF", 0.01)
+    monkeypatch.setattr(cdsp, "MAX_BACKOFF", 0.04)
+
+
+def test_replays_state_after_connection_is_killed():
+    async def run():
+        port = free_port()
+        fake = FakeCamillaDSP("/configs/a.yml")
+        await fake.start(HOST, port)
+        conn = CamillaConnection(HOST, port)
+        conn.start()
+        try:
+            await asyncio.wait_for(conn.ready.wait(), 2)
+            await conn.set_volume(-20.0)
+            await conn.set_config_file_path("/configs/b.yml")
+            assert fake.state == {"ConfigFilePath": "/configs/b.yml", "Volume": -20.0}
+
+            # camilladsp restarts with its own defaults
+            await fake.stop()
+            with pytest.raises(ConnectionError):
+                await conn.set_volume(-25.0)
+            assert not conn.connected
+            fake = FakeCamillaDSP("/configs/a.yml")
+            await fake.start(HOST, port)
+
+            await asyncio.wait_for(conn.ready.wait(), 2)
+            assert fake.state == {"ConfigFilePath": "/configs/b.yml", "Volume": -25.0}
+            assert list(fake.commands)[-3:] == [
+                "SetConfigFilePath",
+                "Reload",
+                "SetVolume",
+            ]
+        finally:
+            conn.stop()
+            await fake.stop()
+
+    asyncio.run(run())
+
+
+def test_reconnect_backs_off_until_server_is_up():
+    async def run():
+        port = free_port()
+        conn = CamillaConnection(HOST, port)
+        attempts = []
+        connect = conn.connect
+
+        def timed_connect() -> bool:
+            attempts.append(time.monotonic())
+            return connect()
+
+        conn.connect = timed_connect
+        conn.start()
+        fake = FakeCamillaDSP("/configs/a.yml")
+        try:
+            await wait_for(lambda: len(attempts) >= 6)
+            # fails fast while disconnected, the volume is still replayed
+            with pytest.raises(ConnectionError):
+                await conn.set_volume(-10.0)
+            await fake.start(HOST, port)
+            await asyncio.wait_for(conn.ready.wait(), 2)
+            assert fake.state["Volume"] == -10.0
+        finally:
+            conn.stop()
+            await fake.stop()
+
+        gaps = [b - a for a, b in zip(attempts, attempts[1:5])]
+        assert gaps[0] < gaps[-1]
+        assert max(gaps) < cdsp.MAX_BACKOFF + 0.05
+
+    asyncio.run(run())
+
+
+def test_rejected_command_keeps_connection():
+    async def run():
+        port = free_port()
+        fake = FakeCamillaDSP("/configs/a.yml")
+        await fake.start(HOST, port)
+        conn = CamillaConnection(HOST, port)
+        conn.start()
+        before = COMMAND_ERRORS.series.get((("command", "validate"),), 0)
+        try:
+            await asyncio.wait_for(conn.ready.wait(), 2)
+            with pytest.raises(CommandError):
+                await conn.validate_config("not a config")
+            assert conn.connected
+            assert COMMAND_ERRORS.series[(("command", "validate"),)] == before + 1
+
+            await conn.set_volume(-30.0)
+            assert fake.state["Volume"] == -30.0
+        finally:
+            conn.stop()
+            await fake.stop()
+
+    asyncio.run(run())
@@ -0,0 +1,60 @@
+import asyncio
+
+from config_switch import SWITCH_SECONDS, ConfigSwitcher, PreloadedConfig
+from control_state import Input
+
+
+class RecordingCamilla:
+    def __init__(self):
+        self.calls = []
+        self.desired_config_path = None
+
+    async def set_config_file_path(self, path: str, reload: bool = True) -> None:
+        self.desired_config_path = path
+        self.calls.append(("path", path, reload))
+
+    async def set_active_config(self, path: str, config: dict) -> None:
+        self.desired_config_path = path
+        self.calls.append(("active", path))
+
+
+def switcher() -> ConfigSwitcher:
+    cdsp = RecordingCamilla()
+    inputs = [Input(index=0, name="TV", configs=["a.yml", "b.yml", "c.yml"])]
+    switcher = ConfigSwitcher(cdsp, "/configs/", inputs)
+    same = {"filters": {"gain": 0}}
+    switcher.configs = {
+        "a.yml": PreloadedConfig("/configs/a.yml", same),
+        "b.yml": PreloadedConfig("/configs/b.yml", dict(same)),
+        "c.yml": PreloadedConfig("/configs/c.yml", {"filters": {"gain": -3}}),
+    }
+    switcher.active = "a.yml"
+    return switcher
+
+
+def test_same_config_moves_path_without_reload():
+    s = switcher()
+    asyncio.run(s.switch("b.yml"))
+    assert s.cdsp.calls == [("path", "/configs/b.yml", False)]
+    assert s.cdsp.desired_config_path == "/configs/b.yml"
+    assert s.active == "b.yml"
+
+
+def test_same_file_sends_nothing():
+    s = switcher()
+    asyncio.run(s.switch("a.yml"))
+    assert s.cdsp.calls == []
+
+
+def test_different_config_is_pushed():
+    s = switcher()
+    asyncio.run(s.switch("c.yml"))
+    assert s.cdsp.calls == [("active", "/configs/c.yml")]
+
+
+def test_unknown_file_is_reloaded_and_timed():
+    s = switcher()
+    before = SWITCH_SECONDS.series.get((("kind", "reload"),), [0])[-1]
+    asyncio.run(s.switch("d.yml"))
+    assert s.cdsp.calls == [("path", "/configs/d.yml", True)]
+    assert SWITCH_SECONDS.series[(("kind", "reload"),)][-1] == before + 1
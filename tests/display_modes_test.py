@@ -0,0 +1,105 @@
+import asyncio
+import numpy as np
+
+from display import DisplayControl, DisplayType, pack_rgb565
+from display_modes import (
+    AlbumArtDisplayMode,
+    DisplayManager,
+    MarqueeConfig,
+    MediaPlayerDisplayMode,
+    MessageDisplayMode,
+    get_atlas,
+)
+from song_state import SongState
+
+MARQUEE = MarqueeConfig(enabled=True, speed=40, pause=2.0)
+
+
+def rendered(mode) -> np.ndarray:
+    displayctl = DisplayControl(type=DisplayType.SIMULATED)
+    mode.render(displayctl)
+    return displayctl.last_frame
+
+
+def test_track_without_fields_renders():
+    song = SongState(mode="play", samplerate="44100")
+    mode = MediaPlayerDisplayMode(song, progress=True, marquee=MARQUEE)
+    assert mode.scrolling == []
+    assert rendered(mode).any()
+
+
+def test_marquee_starts_as_the_cut_off_line():
+    song = SongState(
+        artist="Simulated Artist Name",
+        title="Jóga, Hyperballad and Bachelorette",
+        album="Homogenic",
+        duration=200,
+        samplerate="44100",
+    )
+    scrolling = MediaPlayerDisplayMode(song, progress=True, marquee=MARQUEE)
+    assert [i for i, _ in scrolling.scrolling] == [0, 1]
+    still = MediaPlayerDisplayMode(song, progress=True)
+    assert np.array_equal(rendered(scrolling), rendered(still))
+
+
+def test_marquee_replaces_only_the_pixels_it_covers():
+    song = SongState(title="A title long enough to scroll", samplerate="44100")
+    mode = MediaPlayerDisplayMode(song, marquee=MARQUEE)
+    displayctl = DisplayControl(type=DisplayType.SIMULATED)
+    # red under the text, a packed max would keep red over grey text pixels
+    red = pack_rgb565(np.array([255, 0, 0]))
+    base = np.full((240, 240), red, dtype=">u2")
+    mode.cached_frame = lambda _: base
+    mode.render(displayctl)
+
+    marquee = mode.get_marquee(displayctl, song.title)
+    window, opaque = marquee.window(0)
+    line_height = get_atlas(MediaPlayerDisplayMode.font_size).line_height
+    top = mode.scrolling[0][0] * line_height + marquee.top
+    rows = displayctl.last_frame[top : top + marquee.height]
+    assert opaque.any()
+    assert np.array_equal(rows[opaque], window[opaque])
+    assert (rows[~opaque] == red).all()
+
+
+def test_album_art_is_current_only_after_download():
+    async def run():
+        manager = DisplayManager({"display": {"type": "SIMULATED"}})
+        downloaded = asyncio.Event()
+
+        async def fetch(url):
+            await downloaded.wait()
+
+        manager.art_cache.fetch = fetch
+        before = MessageDisplayMode("input")
+        manager.put(before)
+        task = asyncio.create_task(manager.put_album_art(SongState(title="a")))
+        await asyncio.sleep(0)
+        # an overlay reverting now must not show art that isn't there yet
+        await manager.revert_display_after(0)
+        assert manager.current is before
+        downloaded.set()
+        await task
+        assert isinstance(manager.current, AlbumArtDisplayMode)
+
+    asyncio.run(run())
+
+
+def test_newer_mode_wins_over_pending_album_art():
+    async def run():
+        manager = DisplayManager({"display": {"type": "SIMULATED"}})
+        downloaded = asyncio.Event()
+
+        async def fetch(url):
+            await downloaded.wait()
+
+        manager.art_cache.fetch = fetch
+        task = asyncio.create_task(manager.put_album_art(SongState(title="a")))
+        await asyncio.sleep(0)
+        newer = MessageDisplayMode("newer")
+        manager.put(newer)
+        downloaded.set()
+        await task
+        assert manager.current is newer
+
+    asyncio.run(run())
@@ -0,0 +1,76 @@
+import numpy as np
+
+from display import TRANSFER_SECONDS, DisplayControl, DisplayType, dirty_boxes
+
+
+def frames():
+    prev = np.zeros((240, 240), dtype=">u2")
+    return prev, prev.copy()
+
+
+def test_unchanged_frame_has_no_boxes():
+    prev, curr = frames()
+    assert dirty_boxes(prev, curr) == []
+
+
+def test_single_change_is_bounded_tightly():
+    prev, curr = frames()
+    curr[100:110, 30:50] = 0xFFFF
+    assert dirty_boxes(prev, curr) == [(30, 100, 50, 110)]
+
+
+def test_bands_within_gap_are_merged():
+    prev, curr = frames()
+    curr[10:12, 5:10] = 1
+    # 8 rows apart, no more than the gap
+    curr[19:20, 200:210] = 1
+    assert dirty_boxes(prev, curr) == [(5, 10, 210, 20)]
+
+
+def test_distant_bands_are_separate():
+    prev, curr = frames()
+    curr[10:12, 5:10] = 1
+    curr[100:101, 200:210] = 1
+    assert dirty_boxes(prev, curr) == [(5, 10, 10, 12), (200, 100, 210, 101)]
+
+
+def transfers(kind: str) -> int:
+    series = TRANSFER_SECONDS.series.get((("kind", kind),))
+    return series[-1] if series else 0
+
+
+def test_small_change_is_sent_as_partial_transfer():
+    displayctl = DisplayControl(type=DisplayType.SIMULATED)
+    prev, curr = frames()
+    displayctl.show_frame(prev)
+    assert displayctl.frame_bytes == 240 * 240 * 2
+    curr[10:20, 10:20] = 0xFFFF
+    partial = transfers("partial")
+    displayctl.show_frame(curr)
+    assert displayctl.frame_bytes == 10 * 10 * 2
+    assert transfers("partial") == partial + 1
+
+
+def test_rotated_display_falls_back_to_luma():
+    displayctl = DisplayControl(type=DisplayType.SIMULATED, rotate=1)
+    assert not displayctl.direct
+    prev, curr = frames()
+    curr[0:10, 0:20] = 0xF800
+    displayctl.show_frame(prev)
+    displayctl.show_frame(curr)
+    # luma rotated the full frame, the red block ends up on another edge
+    framebuffer = displayctl.device.framebuffer
+    assert (framebuffer[..., 0] > 0).sum() == 10 * 20
+    assert not framebuffer[0:10, 0:20, 0].all()
+
+
+def test_missing_luma_internals_fall_back_to_luma(monkeypatch):
+    from simulator import SimulatedDevice
+
+    monkeypatch.delattr(SimulatedDevice, "set_window")
+    displayctl = DisplayControl(type=DisplayType.SIMULATED)
+    assert not displayctl.direct
+    _, curr = frames()
+    curr[5:6, 5:6] = 0xFFFF
+    displayctl.show_frame(curr)
+    assert displayctl.device.framebuffer[5, 5].all()
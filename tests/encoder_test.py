@@ -0,0 +1,150 @@
+import asyncio
+import pytest
+
+from types import SimpleNamespace
+from encoder import (
+    BATCHES,
+    DETENTS,
+    GPIO_A,
+    TRANSITIONS,
+    UP_SEQUENCE,
+    EncoderBridge,
+    EncoderControl,
+    RotaryEncoder,
+)
+from simulator import SimulatedPi
+
+
+def encoder():
+    pi = SimulatedPi()
+    turns = []
+    RotaryEncoder(
+        rotate_callback=lambda direction, _: turns.append(direction),
+        sw_callback=lambda: None,
+        pi=pi,
+    )
+    return pi, turns
+
+
+def test_transition_table():
+    for i, state in enumerate(UP_SEQUENCE):
+        following = UP_SEQUENCE[(i + 1) % 4]
+        assert TRANSITIONS[state << 2 | following] == 1
+        assert TRANSITIONS[following << 2 | state] == -1
+        # a repeated level and a skipped state don't count
+        assert TRANSITIONS[state << 2 | state] == 0
+        assert TRANSITIONS[state << 2 | UP_SEQUENCE[(i + 2) % 4]] == 0
+    assert sum(v != 0 for v in TRANSITIONS) == 8
+
+
+@pytest.mark.parametrize("steps", [1, 3, -1, -4])
+def test_turns_decode_to_detents(steps):
+    pi, turns = encoder()
+    pi.turn(steps)
+    assert turns == [1 if steps > 0 else -1] * abs(steps)
+
+
+def test_bounce_back_to_rest_cancels_out():
+    pi, turns = encoder()
+    # A leaves rest and bounces back before B follows
+    pi.edge(GPIO_A, 0)
+    pi.edge(GPIO_A, 1)
+    assert turns == []
+    pi.turn(1)
+    assert turns == [1]
+
+
+def encoder_control(steps: list) -> EncoderControl:
+    # must be created on the running loop
+    async def volume_step(delta: float):
+        steps.append(delta)
+
+    ctl = SimpleNamespace(
+        power=SimpleNamespace(activity=lambda: None), volume_step=volume_step
+    )
+    remotectl = SimpleNamespace(ctl=ctl, press=lambda button: None)
+    return EncoderControl(remotectl, pi=SimulatedPi(edge_interval_us=1000))
+
+
+def test_fast_flick_steps_stay_fine():
+    async def run():
+        control = encoder_control([])
+        # 5 detents 2ms apart, far over the fastest acceleration row
+        return [control.step_size(1, None)] + [
+            control.step_size(1, 0.002) for _ in range(4)
+        ]
+
+    steps = asyncio.run(run())
+    assert steps == [0.5, 0.5, 0.5, 0.5, 1.0]
+
+
+def test_long_fast_spin_climbs_one_row_per_detent():
+    async def run():
+        control = encoder_control([])
+        return [control.step_size(1, None)] + [
+            control.step_size(1, 0.002) for _ in range(7)
+        ]
+
+    assert asyncio.run(run()) == [0.5, 0.5, 0.5, 0.5, 1.0, 2.0, 4.0, 4.0]
+
+
+def test_quick_flick_moves_volume_at_most_3db():
+    async def run():
+        steps = []
+        control = encoder_control(steps)
+        pi = control.rotary.pi
+        await asyncio.to_thread(pi.turn, 5)
+        await asyncio.sleep(0.1)
+        return steps
+
+    steps = asyncio.run(run())
+    assert steps and sum(steps) <= 3.0
+
+
+def test_batch_is_capped():
+    async def run():
+        steps = []
+        control = encoder_control(steps)
+        control.deliver(10.0, 0)
+        control.deliver(-10.0, 0)
+        await asyncio.sleep(0)
+        return steps
+
+    assert asyncio.run(run()) == [3.0, -3.0]
+
+
+def test_bridge_delivers_first_batch_then_one_per_interval():
+    async def run():
+        batches = []
+        bridge = EncoderBridge(
+            asyncio.get_running_loop(),
+            lambda delta, presses: batches.append((delta, presses)),
+            interval=0.05,
+        )
+        before = (BATCHES.series.get((), 0), DETENTS.series.get((), 0))
+
+        def burst():
+            for _ in range(9):
+                bridge.add(0.5)
+            bridge.add(presses=1)
+
+        await asyncio.to_thread(bridge.add, 0.5)
+        await asyncio.sleep(0.01)
+        assert batches == [(0.5, 0)]
+
+        # everything from the pigpio thread within the interval is one batch
+        await asyncio.to_thread(burst)
+        await asyncio.sleep(0.01)
+        assert batches == [(0.5, 0)]
+        await asyncio.sleep(0.1)
+        assert batches == [(0.5, 0), (4.5, 1)]
+
+        # once input stopped the next detent is delivered right away again
+        assert not bridge.scheduled
+        await asyncio.to_thread(bridge.add, -0.5)
+        await asyncio.sleep(0.01)
+        assert batches[-1] == (-0.5, 0)
+        after = (BATCHES.series[()], DETENTS.series[()])
+        return after[0] - before[0], after[1] - before[1]
+
+    assert asyncio.run(run()) == (3, 11)
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from display import pack_rgb565, unpack_rgb565
+from framebuffer import FramebufferDevice, FramebufferGeometry
+
+WIDTH, HEIGHT = 16, 8
+
+
+def device(tmp_path, bits_per_pixel: int, padding: int = 0) -> FramebufferDevice:
+    # a plain file stands in for /dev/fbN, rows padded like some drivers do
+    stride = WIDTH * bits_per_pixel // 8 + padding
+    path = tmp_path / "fb"
+    path.write_bytes(bytes(stride * HEIGHT))
+    geometry = FramebufferGeometry(WIDTH, HEIGHT, bits_per_pixel, stride)
+    return FramebufferDevice(str(path), geometry)
+
+
+def frame() -> np.ndarray:
+    rng = np.random.default_rng(0)
+    return pack_rgb565(rng.integers(0, 256, (HEIGHT, WIDTH, 3), dtype=np.uint8))
+
+
+@pytest.mark.parametrize("padding", [0, 8])
+def test_16bpp_is_native_endian_rgb565(tmp_path, padding):
+    fb = device(tmp_path, 16, padding)
+    packed = frame()
+    assert fb.write(packed, (0, 0, WIDTH, HEIGHT)) == WIDTH * HEIGHT * 2
+    fb.map.flush()
+    raw = np.frombuffer((tmp_path / "fb").read_bytes(), dtype="=u2")
+    pixels = raw.reshape(HEIGHT, -1)[:, :WIDTH]
+    assert np.array_equal(pixels, packed.astype("=u2"))
+    fb.cleanup()
+
+
+def test_32bpp_is_bgrx(tmp_path):
+    fb = device(tmp_path, 32)
+    packed = frame()
+    fb.write(packed, (0, 0, WIDTH, HEIGHT))
+    fb.map.flush()
+    raw = np.frombuffer((tmp_path / "fb").read_bytes(), dtype=np.uint8)
+    pixels = raw.reshape(HEIGHT, WIDTH, 4)
+    assert np.array_equal(pixels[..., 2::-1], unpack_rgb565(packed))
+    fb.cleanup()
+
+
+def test_partial_write_leaves_rest(tmp_path):
+    fb = device(tmp_path, 16)
+    packed = frame()
+    assert fb.write(packed, (2, 3, 6, 5)) == 4 * 2 * 2
+    written = np.zeros((HEIGHT, WIDTH), dtype="=u2")
+    written[3:5, 2:6] = packed[3:5, 2:6]
+    assert np.array_equal(fb.pixels, written)
+    fb.cleanup()
+
+
+def test_blank_on_plain_file_is_ignored(tmp_path):
+    fb = device(tmp_path, 16)
+    fb.hide()
+    fb.show()
+    fb.cleanup()
+
+
+def test_unsupported_depth(tmp_path):
+    with pytest.raises(ValueError):
+        device(tmp_path, 24)
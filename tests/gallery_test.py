@@ -0,0 +1,73 @@
+import numpy as np
+
+from PIL import Image
+from gallery import GALLERY_LOADS, Gallery
+
+SIZE = (16, 8)
+COLORS = [(255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 255)]
+
+
+def gallery(tmp_path, frames: int, spill: bool = True) -> Gallery:
+    paths = []
+    for i, color in enumerate(COLORS):
+        path = tmp_path / f"{i}.png"
+        Image.new("RGB", (32, 16), color).save(path)
+        paths.append(path)
+    frame_bytes = SIZE[0] * SIZE[1] * 2
+    budget = frames * frame_bytes / 1024 / 1024
+    return Gallery(paths, SIZE, {"memory_budget": budget, "spill": spill})
+
+
+def loads(source: str) -> int:
+    return GALLERY_LOADS.series.get((("source", source),), 0)
+
+
+def test_budget_evicts_least_recently_used(tmp_path):
+    g = gallery(tmp_path, frames=2)
+    g.preload()
+    assert len(g.frames) == 2
+    assert 2 in g.frames and 3 in g.frames
+
+    g.get(2)
+    g.get(0)
+    assert 2 in g.frames and 0 in g.frames
+    assert 3 not in g.frames
+
+
+def test_evicted_frames_are_read_back_from_spill(tmp_path):
+    g = gallery(tmp_path, frames=2)
+    g.preload()
+    memory, spill, decode = loads("memory"), loads("spill"), loads("decode")
+
+    # 3 is still in memory, 0 and 1 evicted by preloading the later images
+    frames = {i: g.get(i) for i in (3, 0, 1)}
+    assert loads("memory") == memory + 1
+    assert loads("spill") == spill + 2
+    assert np.array_equal(g.get(1), frames[1])
+    assert loads("memory") == memory + 2
+    assert loads("decode") == decode
+    for i, frame in frames.items():
+        assert frame.shape == (SIZE[1], SIZE[0])
+        assert np.array_equal(frame, g.load(i))
+    assert not np.array_equal(frames[0], frames[1])
+
+
+def test_without_spill_evicted_frames_are_decoded(tmp_path):
+    g = gallery(tmp_path, frames=2, spill=False)
+    g.preload()
+    decode = loads("decode")
+
+    frame = g.get(0)
+    assert loads("decode") == decode + 1
+    assert np.array_equal(frame, g.load(0))
+    assert 0 in g.frames
+
+
+def test_frame_not_preloaded_is_decoded_once(tmp_path):
+    g = gallery(tmp_path, frames=2)
+    decode, memory = loads("decode"), loads("memory")
+
+    first = g.get(1)
+    assert np.array_equal(g.get(1), first)
+    assert loads("decode") == decode + 1
+    assert loads("memory") == memory + 1
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from PIL import Image, ImageDraw
+from display_modes import (
+    InputDisplayMode,
+    MediaPlayerDisplayMode,
+    VolumeDisplayMode,
+    get_atlas,
+    get_font,
+)
+
+# font size and strings each display mode draws through the atlas
+CASES = [
+    (
+        MediaPlayerDisplayMode.font_size,
+        [
+            "Simulated Artist\nTrack 1\nAlbum 1\n",
+            "Björk\nJóga\nHomogenic\n",
+            "  -35.5dB",
+            "44.1kHz",
+            "1:02/3:45",
+        ],
+    ),
+    (VolumeDisplayMode.vol_font_size, ["-35.", "-9.5", "0.0"]),
+    (VolumeDisplayMode.db_font_size, ["dB"]),
+    (InputDisplayMode.input_font_size, ["Digit", "TV", "Analo"]),
+    (InputDisplayMode.vol_font_size, ["-35.5", "-120.0"]),
+]
+
+
+def rendered(size: int, text: str, atlas: bool) -> np.ndarray:
+    image = Image.new("RGB", (240, 240))
+    draw = ImageDraw.Draw(image)
+    if atlas:
+        get_atlas(size).draw(draw, (3, 7), text, fill="white")
+    else:
+        draw.text((3, 7), text, font=get_font(size), fill="white")
+    return np.asarray(image)
+
+
+@pytest.mark.parametrize(
+    "size,text", [(size, text) for size, texts in CASES for text in texts]
+)
+def test_atlas_matches_draw_text(size, text):
+    assert np.array_equal(rendered(size, text, True), rendered(size, text, False))
+
+
+def test_mask_none_for_blank_text():
+    assert get_atlas(26).mask("   ") is None
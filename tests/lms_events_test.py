@@ -0,0 +1,79 @@
+import asyncio
+import socket
+
+from types import SimpleNamespace
+import lms_events
+from lms_events import LMSEventListener
+from simulator import FakeLMS
+from squeezebox import SqueezeboxControl
+
+HOST = "127.0.0.1"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind((HOST, 0))
+        return s.getsockname()[1]
+
+
+async def wait_for(condition, timeout: float = 2.0) -> None:
+    async with asyncio.timeout(timeout):
+        while not condition():
+            await asyncio.sleep(0.01)
+
+
+def test_only_own_player_triggers_refresh():
+    async def run():
+        lms = FakeLMS("pi_player")
+        cli_port = free_port()
+        await lms.start(HOST, free_port(), cli_port)
+        ctl = SimpleNamespace(power=SimpleNamespace(subscribe=lambda _: None))
+        squeezectl = SqueezeboxControl(
+            {
+                "lms_server_ip": HOST,
+                "cli_port": cli_port,
+                "polling_sleep": 1,
+                "client_name": "pi_player",
+            },
+            ctl,
+        )
+        task = asyncio.create_task(squeezectl.events.listen(lms.player_id))
+        try:
+            await wait_for(lambda: squeezectl.events.connected and lms.subscribers)
+            lms.notify("playlist newsong Other", player_id="00:00:00:00:00:02")
+            await asyncio.sleep(0.1)
+            assert not squeezectl.updated.is_set()
+
+            lms.notify("playlist newsong Mine")
+            await wait_for(squeezectl.updated.is_set)
+        finally:
+            task.cancel()
+            await lms.stop()
+
+    asyncio.run(run())
+
+
+def test_reconnects_after_server_drops(monkeypatch):
+    monkeypatch.setattr(lms_events, "MIN_BACKOFF", 0.05)
+
+    async def run():
+        lms = FakeLMS("pi_player")
+        port, cli_port = free_port(), free_port()
+        await lms.start(HOST, port, cli_port)
+        events = []
+        listener = LMSEventListener(HOST, cli_port, on_event=events.append)
+        task = asyncio.create_task(listener.listen(lms.player_id))
+        try:
+            await wait_for(lambda: listener.connected and lms.subscribers)
+            await lms.stop()
+            lms = FakeLMS("pi_player")
+            await lms.start(HOST, port, cli_port)
+            await wait_for(lambda: lms.subscribers)
+            lms.notify("playlist newsong Again")
+            await wait_for(lambda: events)
+            assert events == [["playlist", "newsong", "Again"]]
+        finally:
+            task.cancel()
+            await lms.stop()
+
+    asyncio.run(run())
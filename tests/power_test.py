@@ -0,0 +1,85 @@
+import asyncio
+import time
+
+from power import PowerManager, PowerState
+
+
+def test_target_follows_idle_time():
+    power = PowerManager({"dim_after": 60, "sleep_after": 600})
+    start = power.last_activity
+    assert power.target(start + 59) == PowerState.ACTIVE
+    assert power.target(start + 60) == PowerState.DIMMED
+    assert power.target(start + 600) == PowerState.SLEEPING
+    assert power.next_change(start + 10) == 50
+    assert power.next_change(start + 60) == 540
+    assert power.next_change(start + 600) is None
+
+
+def test_playing_dims_but_never_sleeps():
+    power = PowerManager({"dim_after": 60, "sleep_after": 600})
+    power.playing(True)
+    start = power.last_activity
+    assert power.target(start + 60) == PowerState.DIMMED
+    assert power.target(start + 6000) == PowerState.DIMMED
+    assert power.next_change(start + 60) is None
+
+
+def test_thresholds_are_independent():
+    never_dims = PowerManager({"dim_after": None, "sleep_after": 600})
+    start = never_dims.last_activity
+    assert never_dims.target(start + 599) == PowerState.ACTIVE
+    assert never_dims.target(start + 600) == PowerState.SLEEPING
+
+    never_sleeps = PowerManager({"dim_after": 60, "sleep_after": None})
+    start = never_sleeps.last_activity
+    assert never_sleeps.target(start + 6000) == PowerState.DIMMED
+    assert never_sleeps.next_change(start + 60) is None
+
+
+def test_refresh_loop_notifies_listeners():
+    async def run():
+        power = PowerManager({"dim_after": 0.05, "sleep_after": 0.15})
+        changes = []
+
+        async def listener(state: PowerState) -> None:
+            changes.append((state, time.monotonic() - power.last_activity))
+
+        power.subscribe(listener)
+        task = asyncio.create_task(power.refresh_loop())
+        try:
+            await asyncio.sleep(0.3)
+            assert [state for state, _ in changes] == [
+                PowerState.DIMMED,
+                PowerState.SLEEPING,
+            ]
+            (_, dimmed), (_, slept) = changes
+            assert 0.05 <= dimmed < 0.12
+            assert 0.15 <= slept < 0.25
+
+            # input wakes it right away
+            power.activity()
+            await asyncio.sleep(0.01)
+            assert changes[-1][0] == PowerState.ACTIVE
+            assert power.state == PowerState.ACTIVE
+
+            # playback holds it at dimmed
+            power.playing(True)
+            await asyncio.sleep(0.25)
+            assert [state for state, _ in changes[-2:]] == [
+                PowerState.ACTIVE,
+                PowerState.DIMMED,
+            ]
+            assert power.state == PowerState.DIMMED
+
+            # stopping counts as activity, then sleep follows as usual
+            power.playing(False)
+            await asyncio.sleep(0.3)
+            assert [state for state, _ in changes[-3:]] == [
+                PowerState.ACTIVE,
+                PowerState.DIMMED,
+                PowerState.SLEEPING,
+            ]
+        finally:
+            task.cancel()
+
+    asyncio.run(run())
@@ -0,0 +1,92 @@
+import aiohttp
+import asyncio
+import numpy as np
+import socket
+import time
+import yaml
+
+from pathlib import Path
+from display import pack_rgb565
+from remote import RemoteButton
+from simulator import SimulatedDevice, SimulatedInputDevice, Simulator
+
+HOST = "127.0.0.1"
+CONFIG = Path(__file__).parent.parent / "config.yaml"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind((HOST, 0))
+        return s.getsockname()[1]
+
+
+def test_device_decodes_window_and_records_transfer():
+    device = SimulatedDevice(width=8, height=4, bus_speed_hz=0)
+    pixels = np.zeros((2, 3, 3), dtype=np.uint8)
+    pixels[..., 0] = 255
+    device.set_window(2, 1, 5, 3)
+    device.data(pack_rgb565(pixels).tobytes())
+
+    assert (device.framebuffer[1:3, 2:5] == pixels).all()
+    assert device.framebuffer.sum() == pixels.sum()
+    (transfer,) = device.transfers
+    assert transfer.box == (2, 1, 5, 3)
+    assert transfer.nbytes == 2 * 3 * 2
+    assert device.bytes_sent == 12 and device.frames == 1
+
+
+def test_device_sleeps_for_bus_time():
+    # 240x240 RGB565 at 8MHz is ~115ms on the bus
+    device = SimulatedDevice(bus_speed_hz=8000000)
+    start = time.monotonic()
+    device.data(bytes(240 * 240 * 2))
+    assert time.monotonic() - start >= 240 * 240 * 2 * 8 / 8000000
+
+
+def test_input_device_yields_scancodes():
+    async def run():
+        device = SimulatedInputDevice()
+        device.press(0x45, timestamp=1000.25)
+        events = device.async_read_loop()
+        return await anext(events)
+
+    event = asyncio.run(run())
+    assert (event.type, event.code, event.value) == (4, 4, 0x45)
+    assert event.timestamp() == 1000.25
+
+
+def test_simulator_serves_rewritten_config():
+    config = yaml.safe_load(CONFIG.read_text())
+    config["simulator"] = {
+        "camilladsp_port": free_port(),
+        "lms_port": free_port(),
+        "lms_cli_port": free_port(),
+    }
+
+    async def run():
+        sim = Simulator(config)
+        applied = sim.apply(config)
+        await sim.start(applied)
+        configs_dir = Path(applied["camilladsp_configs_path"])
+        try:
+            assert applied["display"]["type"] == "SIMULATED"
+            first = next(iter(config["inputs"].values()))[0]
+            path = sim.cdsp.execute("GetConfigFilePath")["GetConfigFilePath"]["value"]
+            assert Path(path) == configs_dir / first and Path(path).exists()
+
+            sb = applied["squeezebox"]
+            url = f"http://{sb['lms_server_ip']}:{sb['lms_server_port']}/jsonrpc.js"
+            body = {"id": 1, "method": "slim.request", "params": ["", ["status"]]}
+            async with aiohttp.ClientSession() as session:
+                async with session.post(url, json=body) as resp:
+                    status = (await resp.json())["result"]
+            assert status["player_name"] == config["squeezebox"]["client_name"]
+
+            sim.press(RemoteButton.VOL_UP)
+            event = await anext(sim.input_device.async_read_loop())
+            assert event.value == sim.keymap[RemoteButton.VOL_UP]
+        finally:
+            await sim.stop()
+        assert not configs_dir.exists()
+
+    asyncio.run(run())
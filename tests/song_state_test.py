@@ -0,0 +1,52 @@
+import pytest
+
+import song_state
+from song_state import SongState
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(song_state, "monotonic", lambda: now[0])
+    return now
+
+
+def test_elapsed_interpolates_while_playing(clock):
+    s = SongState(title="a", time=10, duration=180, mode="play")
+    clock[0] += 2.5
+    assert s.elapsed() == 12.5
+
+
+def test_elapsed_is_capped_at_length(clock):
+    s = SongState(title="a", time=178, duration=180, mode="play")
+    clock[0] += 5
+    assert s.elapsed() == 180
+    # streams without a length keep counting
+    s = SongState(title="a", time=178, duration=0, mode="play")
+    clock[0] += 5
+    assert s.elapsed() == 183
+
+
+@pytest.mark.parametrize("mode", ["pause", "stop", None])
+def test_elapsed_holds_when_not_playing(clock, mode):
+    s = SongState(title="a", time=10, duration=180, mode=mode)
+    clock[0] += 30
+    assert s.elapsed() == 10
+
+
+def test_resync_restarts_interpolation(clock):
+    s = SongState(title="a", time=10, duration=180, mode="play")
+    clock[0] += 4
+    s.resync(SongState(title="a", time=13, duration=180, mode="play"))
+    assert s.elapsed() == 13
+    clock[0] += 1
+    assert s.elapsed() == 14
+
+    s.resync(SongState(title="a", time=20, duration=180, mode="pause"))
+    clock[0] += 10
+    assert s.elapsed() == 20
+
+
+def test_equality_ignores_position():
+    assert SongState("b", "a", "t", time=1) == SongState("b", "a", "t", time=99)
+    assert SongState("b", "a", "t") != SongState("b", "a", "u")
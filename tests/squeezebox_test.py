@@ -0,0 +1,39 @@
+import pytest
+
+from media_player import MediaPlayerOp
+from squeezebox import MediaCommand, coalesce_ops
+
+NEXT, PREV, PLAY, PAUSE, STOP = (
+    MediaPlayerOp.NEXT,
+    MediaPlayerOp.PREV,
+    MediaPlayerOp.PLAY,
+    MediaPlayerOp.PAUSE,
+    MediaPlayerOp.STOP,
+)
+
+
+@pytest.mark.parametrize(
+    "ops,commands",
+    [
+        ([], []),
+        ([NEXT], [MediaCommand(NEXT, 1)]),
+        ([NEXT, NEXT, NEXT], [MediaCommand(NEXT, 3)]),
+        ([PREV, PREV], [MediaCommand(NEXT, -2)]),
+        ([NEXT, NEXT, PREV], [MediaCommand(NEXT, 1)]),
+        ([NEXT, PREV], [MediaCommand(NEXT, 0)]),
+        ([PLAY, PLAY], [MediaCommand(PLAY)]),
+        ([STOP, STOP, STOP], [MediaCommand(STOP)]),
+        ([PAUSE, PAUSE], []),
+        ([PAUSE, PAUSE, PAUSE], [MediaCommand(PAUSE)]),
+        (
+            [NEXT, PAUSE, NEXT, NEXT],
+            [MediaCommand(NEXT, 1), MediaCommand(PAUSE), MediaCommand(NEXT, 2)],
+        ),
+        (
+            [PLAY, STOP, PLAY],
+            [MediaCommand(PLAY), MediaCommand(STOP), MediaCommand(PLAY)],
+        ),
+    ],
+)
+def test_coalesce_ops(ops, commands):
+    assert coalesce_ops(ops) == commands
@@ -0,0 +1,55 @@
+import asyncio
+import time
+
+from throttle import Throttle, ThrottleConfig, ThrottleMode
+
+
+def test_leading_drops_rest_of_burst():
+    throttle = Throttle(ThrottleConfig(ThrottleMode.LEADING, interval=0.2, burst=1))
+
+    async def run():
+        # events 0.1s apart keep the burst going, the gap after it ends it
+        times = [0.0, 0.1, 0.2, 0.3, 0.6]
+        return [await throttle.acquire(now=100 + t) for t in times]
+
+    assert asyncio.run(run()) == [True, False, False, False, True]
+
+
+def test_trailing_only_last_of_burst_acts():
+    throttle = Throttle(ThrottleConfig(ThrottleMode.TRAILING, interval=0.05, burst=1))
+
+    async def run():
+        results = []
+
+        async def press():
+            results.append(await throttle.acquire())
+
+        tasks = []
+        for _ in range(3):
+            tasks.append(asyncio.create_task(press()))
+            await asyncio.sleep(0.01)
+        await asyncio.gather(*tasks)
+        return results
+
+    assert asyncio.run(run()) == [False, False, True]
+
+
+def test_latest_rate_limits_and_replaces_waiting_event():
+    throttle = Throttle(ThrottleConfig(ThrottleMode.LATEST, interval=0.1, burst=2))
+
+    async def run():
+        started = time.monotonic()
+        # the burst passes at once, the third and fourth wait for a token and
+        # the fourth replaces the third
+        first = [await throttle.acquire() for _ in range(2)]
+        waiting = asyncio.create_task(throttle.acquire())
+        await asyncio.sleep(0)
+        latest = await throttle.acquire()
+        return first, await waiting, latest, time.monotonic() - started
+
+    first, replaced, latest, elapsed = asyncio.run(run())
+    assert first == [True, True]
+    assert not replaced
+    assert latest
+    # one token refills in interval / burst
+    assert 0.04 <= elapsed < 0.2
@@ -0,0 +1,83 @@
+import asyncio
+
+from types import SimpleNamespace
+from control import Control
+from volume import VolumeEngine
+
+
+class RecordingCamilla:
+    def __init__(self):
+        self.volumes = []
+
+    async def set_volume(self, volume: float) -> None:
+        self.volumes.append(volume)
+
+
+def burst_control(cdsp: RecordingCamilla) -> Control:
+    ctl = Control({"camilladsp_configs_path": "/configs/", "inputs": {"TV": ["a.yml"]}})
+    ctl.state = SimpleNamespace(volume=-30.0, dim=1)
+    ctl.display_manager = SimpleNamespace(put_temp=lambda mode: None)
+    ctl.volume_engine = VolumeEngine(cdsp.set_volume, interval=0.2)
+    return ctl
+
+
+def test_burst_sends_leading_and_trailing_volume():
+    cdsp = RecordingCamilla()
+    ctl = burst_control(cdsp)
+
+    async def run():
+        # steps 5ms apart all land inside one command interval
+        for _ in range(6):
+            await ctl.volume_step(0.5)
+            await asyncio.sleep(0.005)
+        await asyncio.sleep(0.3)
+
+    asyncio.run(run())
+    assert cdsp.volumes == [-29.5, -27.0]
+    assert ctl.state.volume == -27.0
+    stats = ctl.volume_engine.stats()
+    assert (stats.requested, stats.sent, stats.coalesced) == (6, 2, 4)
+
+
+def test_burst_back_to_applied_volume_sends_nothing_more():
+    cdsp = RecordingCamilla()
+    engine = VolumeEngine(cdsp.set_volume, interval=0.2)
+
+    async def run():
+        for volume in (-29.5, -29.0, -29.5):
+            engine.request(volume)
+            await asyncio.sleep(0.005)
+        await asyncio.sleep(0.3)
+
+    asyncio.run(run())
+    assert cdsp.volumes == [-29.5]
+    assert engine.stats().coalesced == 2
+
+
+def test_failed_send_is_not_counted():
+    async def set_volume(volume: float) -> None:
+        raise ConnectionError("cdsp not connected")
+
+    engine = VolumeEngine(set_volume, interval=0.05)
+
+    async def run():
+        engine.request(-20.0)
+        await asyncio.sleep(0.01)
+
+    asyncio.run(run())
+    assert engine.applied is None
+    assert engine.stats() == (1, 0)
+
+
+def test_separate_steps_are_each_sent():
+    cdsp = RecordingCamilla()
+    engine = VolumeEngine(cdsp.set_volume, interval=0.02)
+
+    async def run():
+        for volume in (-30.0, -29.5):
+            engine.request(volume)
+            await asyncio.sleep(0.05)
+
+    asyncio.run(run())
+    assert cdsp.volumes == [-30.0, -29.5]
+    assert engine.stats().coalesced == 0
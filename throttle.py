@@ -1,35 +1,83 @@
+import asyncio
 import time
 
+from enum import StrEnum, auto
+from typing import NamedTuple
 
-class TokenBucket:
-    def __init__(self, tokens, time_unit):
-        self.tokens = tokens
-        self.time_unit = time_unit
-        self.bucket = tokens
-        self.last_check = time.time()
 
-    def has_tokens(self) -> bool:
-        current = time.time()
-        time_passed = current - self.last_check
-        self.last_check = current
+class ThrottleMode(StrEnum):
+    # first event of a burst acts, the rest are dropped until the events
+    # stop for `interval`
+    LEADING = auto()
+    # only the last event of a burst acts, once events stop for `interval`
+    TRAILING = auto()
+    # at most `burst` events per `interval`, events over the rate wait for
+    # a token and a newer event replaces the one waiting
+    LATEST = auto()
 
-        self.bucket = self.bucket + time_passed * (self.tokens / self.time_unit)
-        if self.bucket > self.tokens:
-            self.bucket = self.tokens
 
-        if self.bucket < 1:
-            return False
-        self.bucket = self.bucket - 1
-        return True
+class ThrottleConfig(NamedTuple):
+    mode: ThrottleMode
+    interval: float
+    burst: int
+
+    @staticmethod
+    def from_dict(config: dict, default: "ThrottleConfig") -> "ThrottleConfig":
+        return ThrottleConfig(
+            mode=ThrottleMode(config.get("mode", default.mode).lower()),
+            interval=float(config.get("interval", default.interval)),
+            burst=int(config.get("burst", default.burst)),
+        )
+
+
+class Throttle:
+    # all times are time.monotonic(), i.e. the event loop's clock. callers
+    # may pass the time the event happened, e.g. an evdev timestamp
 
+    def __init__(self, config: ThrottleConfig):
+        self.config = config
+        self.tokens = float(config.burst)
+        self.last_event: float | None = None
+        self.last_refill = time.monotonic()
+        self.generation = 0
 
-class Debounce:
-    def __init__(self, time_unit):
-        self.time_unit = time_unit
-        self.last_check = time.time()
+    async def acquire(self, now: float | None = None) -> bool:
+        # True once the event may act, False if it was dropped or replaced
+        now = time.monotonic() if now is None else now
+        match self.config.mode:
+            case ThrottleMode.LEADING:
+                return self.leading(now)
+            case ThrottleMode.TRAILING:
+                return await self.trailing(now)
+            case ThrottleMode.LATEST:
+                return await self.latest(now)
+
+    def leading(self, now: float) -> bool:
+        last, self.last_event = self.last_event, now
+        return last is None or now - last > self.config.interval
+
+    async def trailing(self, now: float) -> bool:
+        self.generation += 1
+        generation = self.generation
+        self.last_event = now
+        await asyncio.sleep(max(0.0, now + self.config.interval - time.monotonic()))
+        return self.generation == generation
+
+    async def latest(self, now: float) -> bool:
+        self.generation += 1
+        generation = self.generation
+        self.refill(now)
+        while self.tokens < 1:
+            rate = self.config.burst / self.config.interval
+            await asyncio.sleep((1 - self.tokens) / rate)
+            if self.generation != generation:
+                return False
+            self.refill(time.monotonic())
+        self.tokens -= 1
+        return True
 
-    def has_tokens(self) -> bool:
-        current = time.time()
-        time_passed = current - self.last_check
-        self.last_check = current
-        return time_passed > self.time_unit
+    def refill(self, now: float) -> None:
+        elapsed = max(0.0, now - self.last_refill)
+        self.last_refill = max(self.last_refill, now)
+        rate = self.config.burst / self.config.interval
+        self.tokens = min(float(self.config.burst), self.tokens + elapsed * rate)
@@ -0,0 +1,57 @@
+import asyncio
+import logging
+import time
+
+from typing import Awaitable, Callable, NamedTuple
+
+
+class VolumeStats(NamedTuple):
+    requested: int
+    sent: int
+
+    @property
+    def coalesced(self) -> int:
+        return self.requested - self.sent
+
+
+class VolumeEngine:
+    def __init__(self, set_volume: Callable[[float], Awaitable[None]], interval: float):
+        self.set_volume = set_volume
+        self.interval = interval
+        self.target: float | None = None
+        self.applied: float | None = None
+        self.last_sent = 0.0
+        self.flush_handle: asyncio.TimerHandle | None = None
+        self.send_task: asyncio.Task | None = None
+        self.requested = 0
+        self.sent = 0
+
+    def request(self, volume: float) -> None:
+        # only the latest target is kept. the first request of a burst is sent
+        # right away, the rest are folded into one trailing send per interval
+        self.requested += 1
+        self.target = volume
+        if self.flush_handle:
+            return
+        delay = max(0.0, self.last_sent + self.interval - time.monotonic())
+        self.flush_handle = asyncio.get_running_loop().call_later(delay, self.flush)
+
+    def flush(self) -> None:
+        self.flush_handle = None
+        if self.target is None or self.target == self.applied:
+            return
+        self.last_sent = time.monotonic()
+        self.send_task = asyncio.create_task(self.send(self.target))
+
+    async def send(self, volume: float) -> None:
+        try:
+            await self.set_volume(volume)
+        except Exception as e:
+            logging.error("set volume failed. %s", e)
+            return
+        self.applied = volume
+        self.sent += 1
+        logging.debug("volume flush. %.1fdB. %s", volume, self.stats())
+
+    def stats(self) -> VolumeStats:
+        return VolumeStats(requested=self.requested, sent=self.sent)